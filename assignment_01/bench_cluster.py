@@ -0,0 +1,125 @@
+# Local load benchmark: broadcast throughput of messaging_server.py as the
+# worker count grows. Starts the server for each worker count, connects framed
+# clients from several load processes and counts delivered chat frames.
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from framing import FrameDecoder, MAGIC, MSG_TEXT, encode_frame
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'messaging_server.py')
+
+
+async def _client(host, port, senders_left, rate, duration, counts):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(MAGIC)
+    await writer.drain()
+    decoder = FrameDecoder()
+    is_sender = senders_left[0] > 0
+    senders_left[0] -= 1
+    payload = encode_frame(MSG_TEXT, b"load " + b"x" * 48)
+    deadline = time.perf_counter() + duration
+
+    async def send():
+        interval = 1.0 / rate
+        while time.perf_counter() < deadline:
+            writer.write(payload)
+            counts['sent'] += 1
+            await asyncio.sleep(interval)
+
+    sender = asyncio.create_task(send()) if is_sender else None
+    try:
+        while time.perf_counter() < deadline:
+            try:
+                data = await asyncio.wait_for(reader.read(65536), timeout=max(0.01, deadline - time.perf_counter()))
+            except asyncio.TimeoutError:
+                break
+            if not data:
+                break
+            if data.startswith(MAGIC):
+                data = data[len(MAGIC):]
+            decoder.feed(data)
+            counts['received'] += sum(1 for msg_type, _ in decoder.frames() if msg_type == MSG_TEXT)
+    finally:
+        if sender is not None:
+            sender.cancel()
+        writer.close()
+
+
+def _load_process(host, port, clients, senders, rate, warmup, duration, results):
+    async def main():
+        counts = {'sent': 0, 'received': 0}
+        senders_left = [senders]
+        await asyncio.sleep(warmup)
+        await asyncio.gather(*(_client(host, port, senders_left, rate, duration, counts) for _ in range(clients)),
+                             return_exceptions=True)
+        results.put(counts)
+    asyncio.run(main())
+
+
+def _wait_for_port(host, port, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server on {host}:{port} did not come up")
+
+
+def run(workers, args):
+    server = subprocess.Popen([sys.executable, SERVER, '--host', args.host, '--port', str(args.port),
+                               '--workers', str(workers)], stdout=subprocess.DEVNULL)
+    try:
+        _wait_for_port(args.host, args.port)
+        time.sleep(1.0 if workers > 1 else 0.2)  # let every worker bind
+        results = multiprocessing.Queue()
+        per_process = args.clients // args.load_processes
+        senders = max(1, args.senders // args.load_processes)
+        loaders = [multiprocessing.Process(target=_load_process,
+                                           args=(args.host, args.port, per_process, senders, args.rate,
+                                                 0.5, args.duration, results))
+                   for _ in range(args.load_processes)]
+        for loader in loaders:
+            loader.start()
+        totals = {'sent': 0, 'received': 0}
+        for _ in loaders:
+            counts = results.get()
+            totals['sent'] += counts['sent']
+            totals['received'] += counts['received']
+        for loader in loaders:
+            loader.join()
+        return totals
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ChatServer worker scaling benchmark")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=12360)
+    parser.add_argument('--workers', default='1,2,4', help="comma separated worker counts")
+    parser.add_argument('--clients', type=int, default=400)
+    parser.add_argument('--senders', type=int, default=40)
+    parser.add_argument('--rate', type=float, default=50.0, help="messages per second per sender")
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--load-processes', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.clients} clients, {args.senders} senders at {args.rate}/s, "
+          f"{args.duration}s per run")
+    for workers in (int(w) for w in args.workers.split(',')):
+        totals = run(workers, args)
+        print(f"workers={workers:<3} sent {totals['sent'] / args.duration:10.0f} msg/s   "
+              f"delivered {totals['received'] / args.duration:12.0f} msg/s")
+
+
+if __name__ == '__main__':
+    main()
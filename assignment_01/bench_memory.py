@@ -0,0 +1,124 @@
+# Memory benchmark: Python heap cost of an idle ChatServer connection.
+#
+# Runs the real ChatServer.handle_client for N simulated connections that have
+# finished the handshake and then sit idle, and reports tracemalloc bytes per
+# connection. No sockets are opened, so 50k connections fit in the default fd
+# limit; kernel socket buffers are not included. To compare with an older
+# revision, point --src at a checkout of it, e.g.
+#
+#     git worktree add /tmp/chat-before HEAD~1
+#     python bench_memory.py --src /tmp/chat-before/assignment_01
+import argparse
+import asyncio
+import gc
+import importlib
+import os
+import sys
+import tracemalloc
+
+
+class IdleTransport:
+    def get_write_buffer_size(self):
+        return 0
+
+    def is_closing(self):
+        return False
+
+    def abort(self):
+        pass
+
+
+class IdleWriter:
+    # Just enough of asyncio.StreamWriter for an idle connection
+    def __init__(self, peername):
+        self.peername = peername
+        self.transport = IdleTransport()
+
+    def get_extra_info(self, name, default=None):
+        return self.peername if name == 'peername' else default
+
+    def write(self, data):
+        pass
+
+    def writelines(self, data):
+        pass
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+async def measure(server_cls, connections: int, framed: bool, magic: bytes) -> float:
+    server = server_cls()
+    # Connections negotiate before they count, so skip the raw-client grace period
+    if hasattr(server, 'negotiate_timeout'):
+        server.negotiate_timeout = 0.01
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    readers = []
+    tasks = []
+    for i in range(connections):
+        reader = asyncio.StreamReader()
+        if framed:
+            reader.feed_data(magic)
+        readers.append(reader)
+        peer = (f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}", 40000 + i % 20000)
+        tasks.append(asyncio.ensure_future(server.handle_client(reader, IdleWriter(peer))))
+    # Wait until every handler has registered its client and parked in reader.read()
+    while len(server.clients) < connections:
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(0.1)
+
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    # The readers belong to the (simulated) transport, not to the per-connection state
+    reader_bytes = sum(sys.getsizeof(r) for r in readers)
+    tracemalloc.stop()
+
+    for reader in readers:
+        reader.feed_eof()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return (after - before - reader_bytes) / connections
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes per idle ChatServer connection")
+    parser.add_argument('--connections', default='10000,50000', help="comma separated connection counts")
+    parser.add_argument('--framed', action='store_true', help="simulate clients that negotiated framing")
+    parser.add_argument('--src', default=os.path.dirname(os.path.abspath(__file__)),
+                        help="directory holding the messaging_server.py to measure")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(args.src))
+    server_module = importlib.import_module('messaging_server')
+    try:
+        magic = importlib.import_module('framing').MAGIC
+    except ImportError:
+        magic = b""
+        if args.framed:
+            parser.error(f"{args.src} has no framing support")
+
+    # The handlers print one line per connection; keep the output readable
+    sys.stdout.flush()
+    real_stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    try:
+        results = [(n, asyncio.run(measure(server_module.ChatServer, n, args.framed, magic)))
+                   for n in (int(c) for c in args.connections.split(','))]
+    finally:
+        sys.stdout.close()
+        sys.stdout = real_stdout
+
+    print(f"{args.src} ({'framed' if args.framed else 'raw'} clients)")
+    for connections, per_connection in results:
+        print(f"{connections:>7} idle connections: {per_connection:8.0f} bytes per connection")
+
+
+if __name__ == '__main__':
+    main()
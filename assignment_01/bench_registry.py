@@ -0,0 +1,107 @@
+# Micro-benchmark: client registry under join/leave churn during a broadcast storm.
+# Compares the old list + asyncio.Lock registry with ClientRegistry snapshots.
+import argparse
+import asyncio
+import random
+import time
+
+from broadcast import BroadcastEngine
+from registry import ClientRegistry
+
+
+class SimulatedClient:
+    __slots__ = ('client_id', 'received')
+    framed = False
+
+    def __init__(self, client_id: int):
+        self.client_id = client_id
+        self.received = 0
+
+    def send(self, data: bytes) -> bool:
+        self.received += 1
+        return True
+
+
+class LockedListRegistry:
+    # The registry as it used to be: a list guarded by one asyncio.Lock
+    def __init__(self):
+        self.clients = []
+        self.lock = asyncio.Lock()
+
+    async def join(self, client):
+        async with self.lock:
+            self.clients.append(client)
+
+    async def leave(self, client):
+        async with self.lock:
+            if client in self.clients:
+                self.clients.remove(client)
+
+    async def snapshot(self):
+        async with self.lock:
+            return self.clients.copy()
+
+
+class SnapshotRegistry:
+    def __init__(self):
+        self.clients = ClientRegistry()
+
+    async def join(self, client):
+        self.clients.add(client.client_id, client)
+
+    async def leave(self, client):
+        self.clients.remove(client.client_id, client)
+
+    async def snapshot(self):
+        return self.clients.snapshot()
+
+
+async def run(registry, clients: int, broadcasts: int, churn: int, seed: int):
+    rng = random.Random(seed)
+    engine = BroadcastEngine()
+    members = [SimulatedClient(i) for i in range(clients)]
+    for client in members:
+        await registry.join(client)
+    next_id = clients
+    payload = b"[00:00:00] deadbeef: benchmark message\n"
+    delivered = 0
+
+    async def storm():
+        nonlocal delivered
+        for _ in range(broadcasts):
+            delivered += engine.fan_out(payload, await registry.snapshot())
+            await asyncio.sleep(0)
+
+    async def churner():
+        nonlocal next_id
+        for _ in range(churn):
+            index = rng.randrange(len(members))
+            await registry.leave(members[index])
+            members[index] = SimulatedClient(next_id)
+            next_id += 1
+            await registry.join(members[index])
+            await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    await asyncio.gather(storm(), *(churner() for _ in range(4)))
+    elapsed = time.perf_counter() - start
+    return elapsed, delivered
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ChatServer client registry benchmark")
+    parser.add_argument('--clients', type=int, default=5000)
+    parser.add_argument('--broadcasts', type=int, default=200)
+    parser.add_argument('--churn', type=int, default=5000, help="join/leave pairs per churn task (4 tasks)")
+    parser.add_argument('--seed', type=int, default=322)
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients, {args.broadcasts} broadcasts, {4 * args.churn} join/leave pairs")
+    for name, factory in (('list + lock', LockedListRegistry), ('snapshot registry', SnapshotRegistry)):
+        elapsed, delivered = asyncio.run(run(factory(), args.clients, args.broadcasts, args.churn, args.seed))
+        print(f"{name:>18}: {elapsed * 1000:8.1f} ms total, {delivered / elapsed:12.0f} deliveries/s, "
+              f"{4 * args.churn * 2 / elapsed:10.0f} joins+leaves/s")
+
+
+if __name__ == '__main__':
+    main()
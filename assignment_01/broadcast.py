@@ -0,0 +1,131 @@
+import asyncio
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional
+
+from session import DROP_OLDEST, POLICIES, ClientSession, SendLimits
+
+
+def _percentile(samples: List[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class BatchStats:
+    # Batch sizes and the delay batching added to each message, over the most
+    # recent `window` batches/messages
+    def __init__(self, window: int = 4096):
+        self.batches = 0
+        self.messages = 0
+        self.bytes = 0
+        self.largest = 0
+        self.sizes: Deque[int] = deque(maxlen=window)
+        self.delays: Deque[float] = deque(maxlen=window)
+
+    def record(self, enqueued: List[float], size: int, flushed: float):
+        self.batches += 1
+        self.messages += len(enqueued)
+        self.bytes += size
+        self.largest = max(self.largest, len(enqueued))
+        self.sizes.append(len(enqueued))
+        self.delays.extend(flushed - t for t in enqueued)
+
+    def summary(self) -> Dict[str, float]:
+        delays = list(self.delays)
+        return {
+            'batches': self.batches,
+            'messages': self.messages,
+            'bytes': self.bytes,
+            'mean_batch': self.messages / self.batches if self.batches else 0.0,
+            'max_batch': self.largest,
+            'p50_batch': _percentile(list(self.sizes), 0.50),
+            'p50_added_ms': _percentile(delays, 0.50) * 1000,
+            'p99_added_ms': _percentile(delays, 0.99) * 1000,
+            'max_added_ms': max(delays) * 1000 if delays else 0.0,
+        }
+
+
+class BroadcastEngine:
+    # Creates client sessions with a shared slow-consumer policy and fans out
+    # messages that are encoded exactly once.
+    #
+    # With batch_window > 0 messages are held for up to that many seconds (or
+    # until batch_bytes have accumulated) and every client receives the whole
+    # batch as one buffer, so burst traffic costs one write per client per batch
+    # rather than one per message.
+    def __init__(self, max_messages: int = 256, max_bytes: int = 1 << 20, policy: str = DROP_OLDEST,
+                 batch_window: float = 0.0, batch_bytes: int = 64 * 1024,
+                 targets: Optional[Callable[[], Iterable[ClientSession]]] = None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown slow-consumer policy {policy!r}, expected one of {POLICIES}")
+        self.limits = SendLimits(max_messages, max_bytes, policy)
+        self.batch_window = batch_window
+        self.batch_bytes = batch_bytes
+        self.targets = targets or (lambda: ())
+        self.batch_stats = BatchStats()
+        self._pending: List[bytes] = []
+        self._pending_framed: List[bytes] = []
+        self._pending_times: List[float] = []
+        self._pending_bytes = 0
+        # Sessions opened while a batch was pending -> messages already pending then.
+        # Those are in the history they are replayed, so they only get the rest.
+        self._joined: Dict[ClientSession, int] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    def open_session(self, session_id: int, client_hash: str, writer: asyncio.StreamWriter) -> ClientSession:
+        # The caller registers the session and snapshots history without awaiting in between
+        session = ClientSession(session_id, client_hash, writer, self.limits)
+        if self._pending:
+            self._joined[session] = len(self._pending)
+        return session
+
+    def publish(self, data: bytes, framed_data: Optional[bytes] = None):
+        # Send to every current target, immediately or as part of the next batch
+        if self.batch_window <= 0:
+            self.fan_out(data, self.targets(), framed_data)
+            return
+
+        self._pending.append(data)
+        self._pending_framed.append(framed_data if framed_data is not None else data)
+        self._pending_times.append(time.perf_counter())
+        self._pending_bytes += len(data)
+        if self._pending_bytes >= self.batch_bytes:
+            self.flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.batch_window, self.flush)
+
+    def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+
+        # One join per batch, shared by every client
+        data = b"".join(self._pending)
+        framed_data = b"".join(self._pending_framed)
+        enqueued = self._pending_times
+        pending, pending_framed, joined = self._pending, self._pending_framed, self._joined
+        self._pending, self._pending_framed, self._pending_times = [], [], []
+        self._pending_bytes = 0
+        self._joined = {}
+
+        sessions = self.targets()
+        if joined:
+            sessions = [session for session in sessions if session not in joined]
+            for session, skip in joined.items():
+                if skip < len(pending):
+                    session.send(b"".join(pending_framed[skip:] if session.framed else pending[skip:]))
+        self.fan_out(data, sessions, framed_data)
+        self.batch_stats.record(enqueued, len(data), time.perf_counter())
+
+    def fan_out(self, data: bytes, sessions: Iterable[ClientSession], framed_data: Optional[bytes] = None) -> int:
+        # Every session gets a reference to the same bytes object; framed
+        # clients share the single pre-framed copy when one is given
+        delivered = 0
+        for session in sessions:
+            if session.send(framed_data if session.framed and framed_data is not None else data):
+                delivered += 1
+        return delivered
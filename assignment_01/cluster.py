@@ -0,0 +1,185 @@
+import asyncio
+import multiprocessing
+import os
+import struct
+import tempfile
+from collections import deque
+from datetime import datetime
+from typing import Deque, List, Optional, Set, Tuple
+
+from framing import FrameDecoder, encode_frame
+from messaging_server import ChatServer
+
+# Frames exchanged over the local bus (Unix-domain socket, framing.py format)
+BUS_PUBLISH = 1  # worker -> hub: a client on this worker sent a message
+BUS_DELIVER = 2  # hub -> workers: message in global order, append and broadcast
+BUS_HISTORY = 3  # hub -> new worker: history replay, append only
+
+RECORD = struct.Struct('!dB')  # timestamp, length of client_hash
+
+
+def pack_record(client_hash: str, message: str, timestamp: datetime) -> bytes:
+    hash_bytes = client_hash.encode()
+    return RECORD.pack(timestamp.timestamp(), len(hash_bytes)) + hash_bytes + message.encode()
+
+
+def unpack_record(payload) -> Tuple[str, str, datetime]:
+    timestamp, hash_length = RECORD.unpack_from(payload)
+    start = RECORD.size
+    client_hash = str(payload[start:start + hash_length], 'utf-8')
+    message = str(payload[start + hash_length:], 'utf-8', 'replace')
+    return client_hash, message, datetime.fromtimestamp(timestamp)
+
+
+class MessageBus:
+    # Hub run by the supervisor. Every published record is relayed to all workers
+    # in the order the hub received it, which gives every worker the same history.
+    def __init__(self, path: str, history_size: int = 100):
+        self.path = path
+        self.history: Deque[bytes] = deque(maxlen=history_size)
+        self.workers: Set[asyncio.StreamWriter] = set()
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self.handle_worker, path=self.path)
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for writer in list(self.workers):
+            writer.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def handle_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # A (re)started worker first catches up on the shared history
+        writer.writelines([encode_frame(BUS_HISTORY, record) for record in self.history])
+        self.workers.add(writer)
+        decoder = FrameDecoder()
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                decoder.feed(data)
+                records = [bytes(payload) for msg_type, payload in decoder.frames() if msg_type == BUS_PUBLISH]
+                if not records:
+                    continue
+                self.history.extend(records)
+                relay = b"".join(encode_frame(BUS_DELIVER, record) for record in records)
+                workers = list(self.workers)
+                for worker in workers:
+                    worker.write(relay)
+                await asyncio.gather(*(worker.drain() for worker in workers), return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            self.workers.discard(writer)
+            writer.close()
+
+
+class BusClient:
+    # Worker side of the bus, installed as ChatServer.bus
+    def __init__(self, server: ChatServer, path: str):
+        self.server = server
+        self.path = path
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def connect(self) -> asyncio.Task:
+        reader, self.writer = await asyncio.open_unix_connection(self.path)
+        self.server.bus = self
+        return asyncio.create_task(self._receive(reader))
+
+    def publish(self, client_hash: str, message: str, timestamp: datetime):
+        # Nothing to publish to once the supervisor has gone; the worker is shutting down
+        if self.writer.is_closing():
+            return
+        self.writer.write(encode_frame(BUS_PUBLISH, pack_record(client_hash, message, timestamp)))
+
+    async def _receive(self, reader: asyncio.StreamReader):
+        decoder = FrameDecoder()
+        while True:
+            try:
+                data = await reader.read(65536)
+            except ConnectionError:
+                # The supervisor closed the bus mid-write; same as a clean EOF
+                data = b''
+            if not data:
+                self.writer.close()
+                return
+            decoder.feed(data)
+            for msg_type, payload in decoder.frames():
+                client_hash, message, timestamp = unpack_record(payload)
+                if msg_type == BUS_DELIVER:
+                    await self.server.deliver(client_hash, message, timestamp)
+                elif msg_type == BUS_HISTORY:
+                    self.server.message_history.append(client_hash, message, timestamp)
+
+
+async def _serve_worker(host: str, port: int, bus_path: str, server_options: dict):
+    server = ChatServer(**server_options)
+    bus_task = await BusClient(server, bus_path).connect()
+    server_task = asyncio.create_task(server.run(host, port, reuse_port=True))
+    # Losing the bus means the supervisor is gone; stop serving
+    await asyncio.wait([bus_task, server_task], return_when=asyncio.FIRST_COMPLETED)
+    server_task.cancel()
+    bus_task.cancel()
+    await asyncio.gather(server_task, bus_task, return_exceptions=True)
+
+
+def run_worker(index: int, host: str, port: int, bus_path: str, server_options: dict):
+    print(f"Worker {index} started (pid {os.getpid()})")
+    try:
+        asyncio.run(_serve_worker(host, port, bus_path, server_options))
+    except KeyboardInterrupt:
+        pass
+
+
+class ChatCluster:
+    # Supervisor: runs the message bus and `workers` ChatServer processes that all
+    # accept on the same port via SO_REUSEPORT. Crashed workers are restarted.
+    def __init__(self, workers: int = 2, host: str = '127.0.0.1', port: int = 12345,
+                 bus_path: Optional[str] = None, history_size: int = 100, **server_options):
+        if server_options.get('history_dir'):
+            raise ValueError("The persistent history log can only be written by a single-process server")
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.bus_path = bus_path or os.path.join(tempfile.gettempdir(), f"net322-chat-{os.getpid()}.sock")
+        self.history_size = history_size
+        self.server_options = dict(server_options, history_size=history_size)
+        # spawn rather than fork: the children must not inherit the running event loop
+        self.context = multiprocessing.get_context('spawn')
+        self.processes: List[multiprocessing.Process] = []
+
+    def _spawn(self, index: int) -> multiprocessing.Process:
+        process = self.context.Process(
+            target=run_worker, args=(index, self.host, self.port, self.bus_path, self.server_options),
+            name=f"chat-worker-{index}", daemon=True)
+        process.start()
+        return process
+
+    async def run(self):
+        bus = MessageBus(self.bus_path, self.history_size)
+        await bus.start()
+        self.processes = [self._spawn(index) for index in range(self.workers)]
+        print(f"Supervisor running {self.workers} workers on {self.host} : {self.port} (bus {self.bus_path})")
+        try:
+            while True:
+                await asyncio.sleep(1)
+                for index, process in enumerate(self.processes):
+                    if not process.is_alive():
+                        print(f"Worker {index} exited with code {process.exitcode}, restarting")
+                        self.processes[index] = self._spawn(index)
+        except asyncio.CancelledError:
+            print("\nStopping workers...")
+        finally:
+            for process in self.processes:
+                if process.is_alive():
+                    process.terminate()
+            for process in self.processes:
+                process.join(timeout=5)
+            await bus.close()
@@ -0,0 +1,101 @@
+import asyncio
+import struct
+from typing import Iterator, Tuple
+
+# Length-prefixed framing shared by the messaging server and client.
+#
+# A client opts in by sending MAGIC as its very first bytes; the server echoes
+# MAGIC back and from then on both sides exchange frames of
+#
+#     !I payload length | !B message type | payload (UTF-8)
+#
+# Clients that start talking without MAGIC stay on the original raw-text protocol.
+MAGIC = b"\x00NET322/F1\n"
+HEADER = struct.Struct('!IB')
+MAX_FRAME_SIZE = 1 << 20
+# Same as the raw protocol's reads, so a raw client's first message is not cut short
+NEGOTIATE_READ_SIZE = 1024
+
+MSG_TEXT = 1     # chat message
+MSG_SYSTEM = 2   # server notices: welcome, history markers
+MSG_HISTORY = 3  # replayed history line
+
+
+class FrameError(ValueError):
+    pass
+
+
+def frame_header(msg_type: int, length: int) -> bytes:
+    return HEADER.pack(length, msg_type)
+
+
+def encode_frame(msg_type: int, payload: bytes) -> bytes:
+    return HEADER.pack(len(payload), msg_type) + payload
+
+
+class FrameDecoder:
+    # Reusable receive buffer. feed() appends bytes, frames() yields
+    # (msg_type, memoryview) pairs pointing straight into the buffer, so payloads
+    # are not copied; a yielded view is only valid until the next feed().
+    def __init__(self, initial_size: int = 64 * 1024, max_frame_size: int = MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray(initial_size)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def feed(self, data: bytes):
+        size = len(data)
+        if self._end + size > len(self._buffer):
+            pending = self._end - self._start
+            if pending + size <= len(self._buffer):
+                # Same-length slice assignment moves the tail down without resizing,
+                # which is allowed even while old payload views are still alive
+                self._buffer[0:pending] = self._buffer[self._start:self._end]
+            else:
+                grown = bytearray(max(len(self._buffer) * 2, pending + size))
+                grown[0:pending] = self._buffer[self._start:self._end]
+                self._buffer = grown
+            self._start, self._end = 0, pending
+        self._buffer[self._end:self._end + size] = data
+        self._end += size
+
+    def frames(self) -> Iterator[Tuple[int, memoryview]]:
+        view = memoryview(self._buffer)
+        while self._end - self._start >= HEADER.size:
+            length, msg_type = HEADER.unpack_from(self._buffer, self._start)
+            if length > self.max_frame_size:
+                raise FrameError(f"Frame of {length} bytes exceeds the {self.max_frame_size} byte limit")
+            payload_start = self._start + HEADER.size
+            if self._end - payload_start < length:
+                break
+            self._start = payload_start + length
+            yield msg_type, view[payload_start:self._start]
+        if self._start == self._end:
+            self._start = self._end = 0
+
+
+async def negotiate(reader: asyncio.StreamReader, timeout: float) -> Tuple[bool, bytes]:
+    # Wait briefly for the framing handshake. Returns (framed, leftover bytes);
+    # for raw clients the leftover is the start of their first message. Reads
+    # are ordinary-sized, so a raw client's first message arrives whole and only
+    # a handshake split across segments needs more than one read.
+    received = b""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while len(received) < len(MAGIC) and MAGIC.startswith(received):
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        try:
+            chunk = await asyncio.wait_for(reader.read(NEGOTIATE_READ_SIZE), timeout=remaining)
+        except asyncio.TimeoutError:
+            break
+        if not chunk:
+            break
+        received += chunk
+    if received.startswith(MAGIC):
+        return True, received[len(MAGIC):]
+    return False, received
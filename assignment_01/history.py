@@ -0,0 +1,66 @@
+from collections import deque
+from datetime import datetime
+from typing import Callable, Deque, List, Optional, Tuple
+
+
+class HistoryEntry:
+    __slots__ = ('client_hash', 'message', 'timestamp', 'encoded')
+
+    def __init__(self, client_hash: str, message: str, timestamp: datetime):
+        self.client_hash = client_hash
+        self.message = message
+        self.timestamp = timestamp
+        self.encoded: Optional[bytes] = None  # cached formatted line, None when stale
+
+
+class MessageHistory:
+    # Bounded chat history. deque(maxlen) gives O(1) append and eviction, and every
+    # entry caches its formatted, encoded line so replaying the history to a new
+    # client is a plain writelines() over the cached bytes.
+    def __init__(self, capacity: int = 100, resolve_name: Optional[Callable[[str], str]] = None):
+        if capacity < 1:
+            raise ValueError("History capacity must be at least 1")
+        self.capacity = capacity
+        self.resolve_name = resolve_name or (lambda client_hash: client_hash)
+        self._entries: Deque[HistoryEntry] = deque(maxlen=capacity)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __bool__(self) -> bool:
+        return bool(self._entries)
+
+    def __iter__(self):
+        for entry in self._entries:
+            yield entry.client_hash, entry.message, entry.timestamp
+
+    def format(self, client_hash: str, message: str, timestamp: datetime) -> str:
+        display_name = self.resolve_name(client_hash)
+        return f"[{timestamp.strftime('%H:%M:%S')}] {display_name}: {message}\n"
+
+    def _encode(self, entry: HistoryEntry) -> bytes:
+        entry.encoded = self.format(entry.client_hash, entry.message, entry.timestamp).encode()
+        return entry.encoded
+
+    def append(self, client_hash: str, message: str, timestamp: datetime) -> bytes:
+        # Returns the encoded line so the caller can broadcast the same buffer
+        entry = HistoryEntry(client_hash, message, timestamp)
+        self._entries.append(entry)
+        return self._encode(entry)
+
+    def invalidate(self, client_hash: str) -> int:
+        # Drop cached lines for one client only, e.g. after a display-name change
+        stale = 0
+        for entry in self._entries:
+            if entry.client_hash == client_hash and entry.encoded is not None:
+                entry.encoded = None
+                stale += 1
+        return stale
+
+    def snapshot(self) -> List[bytes]:
+        # Encoded lines, oldest first; only entries invalidated since the last call are re-formatted
+        return [entry.encoded if entry.encoded is not None else self._encode(entry)
+                for entry in self._entries]
+
+    def entries(self) -> List[Tuple[str, str, datetime]]:
+        return list(self)
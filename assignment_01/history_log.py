@@ -0,0 +1,332 @@
+import asyncio
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+# Append-only, segmented chat log. Each record is
+#
+#     !I record length | !d timestamp | !B hash length | client_hash | message | !I record length
+#
+# The trailing length lets "last N" walk a segment backwards without an index.
+# Segments are read through mmap and decoded one record at a time, so replay never
+# materialises the whole history as Python objects.
+HEADER = struct.Struct('!IdB')
+FOOTER = struct.Struct('!I')
+OVERHEAD = HEADER.size + FOOTER.size
+SEGMENT_SUFFIX = '.log'
+
+Record = Tuple[str, str, datetime]
+
+
+def encode_record(client_hash: str, message: str, timestamp: float) -> bytes:
+    hash_bytes = client_hash.encode()
+    body = message.encode()
+    length = OVERHEAD + len(hash_bytes) + len(body)
+    return HEADER.pack(length, timestamp, len(hash_bytes)) + hash_bytes + body + FOOTER.pack(length)
+
+
+def decode_record(buffer, offset: int) -> Tuple[Record, float, int]:
+    # Returns (record, raw timestamp, record length)
+    length, timestamp, hash_length = HEADER.unpack_from(buffer, offset)
+    start = offset + HEADER.size
+    client_hash = str(buffer[start:start + hash_length], 'utf-8')
+    message = str(buffer[start + hash_length:offset + length - FOOTER.size], 'utf-8', 'replace')
+    return (client_hash, message, datetime.fromtimestamp(timestamp)), timestamp, length
+
+
+class Segment:
+    __slots__ = ('path', 'size', 'count', 'first_ts', 'last_ts')
+
+    def __init__(self, path: str):
+        self.path = path
+        self.size = 0       # bytes known to hold complete records
+        self.count = 0
+        self.first_ts = 0.0
+        self.last_ts = 0.0
+
+    def scan(self) -> int:
+        # Walk the records once to recover metadata; returns the valid length so a
+        # torn write at the end of the file can be truncated away
+        self.size = self.count = 0
+        file_size = os.path.getsize(self.path)
+        if file_size == 0:
+            return 0
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            offset = 0
+            while offset + OVERHEAD <= file_size:
+                length, timestamp, _ = HEADER.unpack_from(view, offset)
+                if length < OVERHEAD or offset + length > file_size \
+                        or FOOTER.unpack_from(view, offset + length - FOOTER.size)[0] != length:
+                    break
+                if self.count == 0:
+                    self.first_ts = timestamp
+                self.last_ts = timestamp
+                self.count += 1
+                offset += length
+        self.size = offset
+        return offset
+
+    def _map(self, size: int) -> Optional[mmap.mmap]:
+        # None if compaction removed the segment after it was picked
+        try:
+            with open(self.path, 'rb') as f:
+                return mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+
+    def records(self, start_ts: float = 0.0, size: Optional[int] = None) -> Iterator[Record]:
+        # size pins the records a caller saw when it started reading
+        size = self.size if size is None else size
+        view = self._map(size) if size else None
+        if view is None:
+            return
+        with view:
+            offset = 0
+            while offset < size:
+                length, timestamp, _ = HEADER.unpack_from(view, offset)
+                if timestamp >= start_ts:
+                    yield decode_record(view, offset)[0]
+                offset += length
+
+    def tail(self, n: int, size: Optional[int] = None) -> Iterator[Record]:
+        # Last n records of this segment, oldest first
+        size = self.size if size is None else size
+        view = self._map(size) if size and n > 0 else None
+        if view is None:
+            return
+        with view:
+            offsets = []
+            end = size
+            while end > 0 and len(offsets) < n:
+                end -= FOOTER.unpack_from(view, end - FOOTER.size)[0]
+                offsets.append(end)
+            for offset in reversed(offsets):
+                yield decode_record(view, offset)[0]
+
+
+class HistoryLog:
+    # Writes go to an in-memory pending list and are flushed to the active segment
+    # by a background task in a worker thread, so appending never blocks the loop.
+    def __init__(self, directory: str, segment_bytes: int = 8 << 20, flush_interval: float = 0.05,
+                 fsync: bool = False, retain_seconds: Optional[float] = None,
+                 max_segments: Optional[int] = None, compact_interval: float = 60.0):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.retain_seconds = retain_seconds
+        self.max_segments = max_segments
+        # Compaction runs on every rotation, and also this often so a quiet log still
+        # lets go of segments that age past retain_seconds
+        self.compact_interval = compact_interval
+        self.segments: List[Segment] = []
+        self._pending: List[Tuple[bytes, float]] = []
+        self._inflight: List[Tuple[bytes, float]] = []  # handed to the writer thread, not yet on disk
+        self._lock = threading.Lock()  # serialises the writer thread and compaction
+        # Held briefly whenever segment metadata, the segment list or _inflight change,
+        # so a reader never sees a record both on disk and in flight
+        self._meta_lock = threading.Lock()
+        self._file = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._compactor: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def __len__(self) -> int:
+        with self._meta_lock:
+            return sum(segment.count for segment in self.segments) + len(self._inflight) + len(self._pending)
+
+    # -- lifecycle -------------------------------------------------------------
+
+    def open_sync(self):
+        os.makedirs(self.directory, exist_ok=True)
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+        self.segments = [Segment(os.path.join(self.directory, name)) for name in names]
+        for segment in self.segments:
+            valid = segment.scan()
+            if valid < os.path.getsize(segment.path):
+                os.truncate(segment.path, valid)
+        if not self.segments or self.segments[-1].size >= self.segment_bytes:
+            self.segments.append(Segment(self._segment_path(self._next_index())))
+        self._file = open(self.segments[-1].path, 'ab')
+        # Whatever expired while the server was down
+        self.compact_sync()
+
+    async def open(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.open_sync)
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._flusher = asyncio.create_task(self._flush_loop())
+        if self.retain_seconds is not None:
+            self._compactor = asyncio.create_task(self._compact_loop())
+
+    async def close(self):
+        if self._compactor is not None:
+            self._compactor.cancel()
+            await asyncio.gather(self._compactor, return_exceptions=True)
+            self._compactor = None
+        # Let an in-progress flush finish rather than cancelling it mid-write
+        if self._flusher is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._flusher
+            self._flusher = None
+        await self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _segment_path(self, index: int) -> str:
+        return os.path.join(self.directory, f"segment-{index:08d}{SEGMENT_SUFFIX}")
+
+    def _next_index(self) -> int:
+        if not self.segments:
+            return 0
+        return int(os.path.basename(self.segments[-1].path)[len('segment-'):-len(SEGMENT_SUFFIX)]) + 1
+
+    # -- writing ---------------------------------------------------------------
+
+    def append(self, client_hash: str, message: str, timestamp: datetime):
+        ts = timestamp.timestamp()
+        self._pending.append((encode_record(client_hash, message, ts), ts))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _flush_loop(self):
+        while not self._closing:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            await self.flush()
+            if not self._closing:
+                await asyncio.sleep(self.flush_interval)
+
+    async def flush(self):
+        if not self._pending or self._file is None:
+            return
+        batch, self._pending = self._pending, []
+        with self._meta_lock:
+            self._inflight = list(batch)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write_batch, batch)
+        finally:
+            with self._meta_lock:
+                self._inflight = []
+
+    def _write_batch(self, batch: List[Tuple[bytes, float]]):
+        # Runs in a worker thread; segment metadata is only advanced once the bytes
+        # are in the file, so mmap readers never see a partial record, and in the
+        # same step the records leave _inflight
+        with self._lock:
+            self._write_records(batch)
+
+    def _write_records(self, batch: List[Tuple[bytes, float]]):
+        index = 0
+        while index < len(batch):
+            segment = self.segments[-1]
+            room = self.segment_bytes - segment.size
+            chunk = []
+            size = 0
+            while index < len(batch) and (not chunk or size + len(batch[index][0]) <= room):
+                chunk.append(batch[index])
+                size += len(batch[index][0])
+                index += 1
+            self._file.write(b"".join(record for record, _ in chunk))
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            with self._meta_lock:
+                if segment.count == 0:
+                    segment.first_ts = chunk[0][1]
+                segment.last_ts = chunk[-1][1]
+                segment.size += size
+                segment.count += len(chunk)
+                del self._inflight[:len(chunk)]
+            if segment.size >= self.segment_bytes:
+                self._rotate()
+
+    def _rotate(self):
+        self._file.close()
+        segment = Segment(self._segment_path(self._next_index()))
+        self._file = open(segment.path, 'ab')
+        with self._meta_lock:
+            self.segments = self.segments + [segment]
+        self._compact()
+
+    # -- compaction ------------------------------------------------------------
+
+    def compact_sync(self) -> int:
+        # Drop sealed segments older than retain_seconds, then the oldest ones past
+        # max_segments. Returns the number of segments removed.
+        with self._lock:
+            return self._compact()
+
+    def _compact(self) -> int:
+        if self.retain_seconds is None and self.max_segments is None:
+            return 0
+        sealed = self.segments[:-1]
+        cutoff = time.time() - self.retain_seconds if self.retain_seconds is not None else None
+        excess = len(self.segments) - self.max_segments if self.max_segments is not None else 0
+        drop = []
+        for segment in sealed:
+            if (cutoff is not None and segment.last_ts < cutoff) or len(drop) < excess:
+                drop.append(segment)
+        if not drop:
+            return 0
+        # Out of the list before the files go, so new readers never pick them
+        with self._meta_lock:
+            self.segments = [segment for segment in self.segments if segment not in drop]
+        for segment in drop:
+            os.unlink(segment.path)
+        return len(drop)
+
+    async def compact(self) -> int:
+        await self.flush()
+        return await asyncio.get_running_loop().run_in_executor(None, self.compact_sync)
+
+    async def _compact_loop(self):
+        while True:
+            await asyncio.sleep(self.compact_interval)
+            await asyncio.get_running_loop().run_in_executor(None, self.compact_sync)
+
+    # -- replay ----------------------------------------------------------------
+
+    def _snapshot(self) -> Tuple[List[Tuple[Segment, int, int, float]], List[Tuple[bytes, float]]]:
+        # (segment, size, count, last_ts) for every segment plus the unflushed records,
+        # taken together so replay neither repeats nor skips a flush that lands mid-way
+        with self._meta_lock:
+            segments = [(segment, segment.size, segment.count, segment.last_ts) for segment in self.segments]
+            return segments, self._inflight + self._pending
+
+    def tail(self, n: int) -> Iterator[Record]:
+        # Last n records, oldest first, including ones not yet flushed
+        if n <= 0:
+            return
+        segments, pending = self._snapshot()
+        pending = pending[-n:]
+        needed = n - len(pending)
+        chosen = []
+        for segment, size, count, _ in reversed(segments):
+            if needed <= 0:
+                break
+            take = min(needed, count)
+            if take:
+                chosen.append((segment, take, size))
+                needed -= take
+        for segment, take, size in reversed(chosen):
+            yield from segment.tail(take, size)
+        for record, _ in pending:
+            yield decode_record(record, 0)[0]
+
+    def since(self, timestamp: datetime) -> Iterator[Record]:
+        start_ts = timestamp.timestamp()
+        segments, pending = self._snapshot()
+        for segment, size, count, last_ts in segments:
+            if count and last_ts >= start_ts:
+                yield from segment.records(start_ts, size)
+        for record, ts in pending:
+            if ts >= start_ts:
+                yield decode_record(record, 0)[0]
@@ -0,0 +1,90 @@
+import asyncio
+import math
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+
+class IdleWheel:
+    # Hashed timing wheel for idle-connection tracking. Tracked objects carry a
+    # `last_activity` attribute; touch() only updates that timestamp, so traffic
+    # costs one attribute store per message. A sweeper ticks every `granularity`
+    # seconds, looks only at the slot that is due, re-files entries that have seen
+    # activity since and hands everything that really expired to `on_expire` as
+    # one batch. Expiry is therefore accurate to within one granularity.
+    def __init__(self, timeout: float = 300.0, granularity: float = 1.0,
+                 on_expire: Optional[Callable[[List[object]], None]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        if timeout <= 0 or granularity <= 0:
+            raise ValueError("Idle timeout and granularity must be positive")
+        self.timeout = timeout
+        self.granularity = granularity
+        self.on_expire = on_expire or (lambda expired: None)
+        self.clock = clock
+        self.slots: List[Set[object]] = [set() for _ in range(math.ceil(timeout / granularity) + 3)]
+        self.slot_of: Dict[object, int] = {}
+        self.expired_total = 0
+        self._tick = self._tick_for(clock())
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.slot_of)
+
+    def _tick_for(self, when: float) -> int:
+        return math.ceil(when / self.granularity)
+
+    def _place(self, item, deadline: float):
+        tick = max(self._tick_for(deadline), self._tick + 1)
+        index = tick % len(self.slots)
+        self.slots[index].add(item)
+        self.slot_of[item] = index
+
+    def add(self, item):
+        item.last_activity = self.clock()
+        self._place(item, item.last_activity + self.timeout)
+
+    def touch(self, item):
+        item.last_activity = self.clock()
+
+    def remove(self, item):
+        index = self.slot_of.pop(item, None)
+        if index is not None:
+            self.slots[index].discard(item)
+
+    def sweep(self) -> List[object]:
+        # Process every tick that has come due since the previous sweep
+        now = self.clock()
+        current = self._tick_for(now)
+        expired = []
+        while self._tick < current:
+            self._tick += 1
+            slot = self.slots[self._tick % len(self.slots)]
+            if not slot:
+                continue
+            due = list(slot)
+            slot.clear()
+            for item in due:
+                deadline = item.last_activity + self.timeout
+                if deadline <= now:
+                    del self.slot_of[item]
+                    expired.append(item)
+                else:
+                    self._place(item, deadline)
+        if expired:
+            self.expired_total += len(expired)
+            self.on_expire(expired)
+        return expired
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.granularity)
+            self.sweep()
+
+    def start(self):
+        self._tick = self._tick_for(self.clock())
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
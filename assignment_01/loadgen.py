@@ -0,0 +1,340 @@
+# Headless load generator for messaging_server.py.
+#
+# Opens many client connections, has a subset of them send timestamped messages
+# at a fixed rate and measures, on every receiving client, how long each
+# broadcast took to arrive. Results are printed as JSON so runs can be compared
+# across commits, e.g.
+#
+#     python loadgen.py --spawn --clients 2000 --senders 100 --rate 5 --output run.json
+#     python loadgen.py --port 12345 --server-pid 4242 --raw
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+from framing import FrameDecoder, MAGIC, MSG_TEXT, encode_frame
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'messaging_server.py')
+PROBE = re.compile(rb'lg (\d+) (\d+) (\d+)')
+
+
+class LatencyHistogram:
+    # Log-linear buckets (16 per power of two, ~4% resolution) over microseconds;
+    # fixed memory however many samples are recorded, and mergeable across processes
+    STEPS = 16
+
+    def __init__(self, counts: Optional[Dict[int, int]] = None):
+        self.counts: Dict[int, int] = dict(counts or {})
+        self.total = sum(self.counts.values())
+        self.sum_us = 0.0
+        self.max_us = 0.0
+
+    def record(self, micros: float):
+        index = int(math.log2(micros) * self.STEPS) if micros >= 1 else 0
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        self.sum_us += micros
+        if micros > self.max_us:
+            self.max_us = micros
+
+    def merge(self, other: 'LatencyHistogram'):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self.sum_us += other.sum_us
+        self.max_us = max(self.max_us, other.max_us)
+
+    def percentile(self, fraction: float) -> float:
+        if not self.total:
+            return 0.0
+        target = fraction * self.total
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                # Bucket upper bound, but never past the largest sample actually seen
+                return min(2 ** ((index + 1) / self.STEPS), self.max_us)
+        return self.max_us
+
+    def summary_ms(self) -> Dict[str, float]:
+        return {
+            'samples': self.total,
+            'mean': round(self.sum_us / self.total / 1000, 3) if self.total else 0.0,
+            'p50': round(self.percentile(0.50) / 1000, 3),
+            'p99': round(self.percentile(0.99) / 1000, 3),
+            'p999': round(self.percentile(0.999) / 1000, 3),
+            'max': round(self.max_us / 1000, 3),
+        }
+
+
+class LoadClient:
+    def __init__(self, index: int, sender: bool, framed: bool, histogram: LatencyHistogram, counters: Dict[str, int]):
+        self.index = index
+        self.sender = sender
+        self.framed = framed
+        self.histogram = histogram
+        self.counters = counters
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        # Probes older than this (e.g. replayed history from an earlier run) are ignored
+        self.since_ns = time.monotonic_ns()
+
+    async def connect(self, host: str, port: int):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        if self.framed:
+            self.writer.write(MAGIC)
+        self.counters['connected'] += 1
+
+    def _observe(self, data: bytes, now_ns: int):
+        for match in PROBE.finditer(data):
+            sent_ns = int(match.group(3))
+            if sent_ns < self.since_ns:
+                continue
+            self.histogram.record((now_ns - sent_ns) / 1000)
+            self.counters['received'] += 1
+
+    async def receive(self, until: float):
+        decoder = FrameDecoder() if self.framed else None
+        handshake = self.framed
+        carry = b""
+        while time.monotonic() < until:
+            try:
+                data = await asyncio.wait_for(self.reader.read(65536), timeout=until - time.monotonic())
+            except asyncio.TimeoutError:
+                break
+            if not data:
+                break
+            now_ns = time.monotonic_ns()
+            if decoder is not None:
+                if handshake:
+                    carry += data
+                    if len(carry) < len(MAGIC):
+                        continue
+                    data, carry, handshake = carry[len(MAGIC):], b"", False
+                decoder.feed(data)
+                for msg_type, payload in decoder.frames():
+                    if msg_type == MSG_TEXT:
+                        self._observe(payload, now_ns)
+            else:
+                # Lines can straddle reads; keep the unfinished tail for next time
+                data = carry + data
+                cut = data.rfind(b"\n") + 1
+                carry = data[cut:]
+                self._observe(data[:cut], now_ns)
+
+    async def send(self, rate: float, start: float, until: float):
+        interval = 1.0 / rate
+        seq = 0
+        next_send = start
+        while True:
+            now = time.monotonic()
+            if now >= until:
+                break
+            if next_send > now:
+                await asyncio.sleep(next_send - now)
+            payload = f"lg {self.index} {seq} {time.monotonic_ns()}".encode()
+            self.writer.write(encode_frame(MSG_TEXT, payload) if self.framed else payload)
+            self.counters['sent'] += 1
+            seq += 1
+            next_send += interval
+            if not self.framed:
+                # Raw mode treats each read as one message, so keep writes apart
+                await self.writer.drain()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+async def _run_slice(config: dict, first_index: int, clients: int, senders: int) -> dict:
+    histogram = LatencyHistogram()
+    counters = {'connected': 0, 'sent': 0, 'received': 0, 'connect_errors': 0}
+    pool = [LoadClient(first_index + i, i < senders, config['framed'], histogram, counters) for i in range(clients)]
+
+    # Ramp up connections at the configured rate
+    ramp_interval = 1.0 / config['connect_rate'] if config['connect_rate'] else 0
+    for client in pool:
+        try:
+            await client.connect(config['host'], config['port'])
+        except OSError:
+            counters['connect_errors'] += 1
+        if ramp_interval:
+            await asyncio.sleep(ramp_interval)
+    connected = [client for client in pool if client.writer is not None]
+
+    # Everyone is connected and past the handshake; the memory sample is taken now
+    start = time.monotonic() + config['settle']
+    until = start + config['duration']
+    receivers = [asyncio.create_task(client.receive(until + config['drain'])) for client in connected]
+    await asyncio.sleep(config['settle'])
+    await asyncio.gather(*(client.send(config['rate'], start, until) for client in connected if client.sender),
+                         return_exceptions=True)
+    await asyncio.gather(*receivers, return_exceptions=True)
+    for client in connected:
+        client.close()
+    return {'counters': counters, 'histogram': histogram.counts, 'sum_us': histogram.sum_us, 'max_us': histogram.max_us}
+
+
+def _slice_process(config: dict, first_index: int, clients: int, senders: int, results):
+    results.put(asyncio.run(_run_slice(config, first_index, clients, senders)))
+
+
+def process_tree_rss(pid: int) -> int:
+    # Resident memory in bytes of `pid` and all its descendants (Linux /proc)
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            children.setdefault(int(fields[1]), []).append(int(entry))
+        except (OSError, IndexError):
+            continue
+    total = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        try:
+            with open(f'/proc/{current}/statm') as f:
+                total += int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except OSError:
+            pass
+        stack.extend(children.get(current, ()))
+    return total
+
+
+def _wait_for_port(host: str, port: int, timeout: float = 15.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server on {host}:{port} did not come up")
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(SERVER), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> dict:
+    server = None
+    server_pid = args.server_pid
+    if args.spawn:
+        server = subprocess.Popen([sys.executable, SERVER, '--host', args.host, '--port', str(args.port),
+                                   *args.server_arg], stdout=subprocess.DEVNULL)
+        server_pid = server.pid
+        _wait_for_port(args.host, args.port)
+        time.sleep(args.server_startup)
+
+    config = {
+        'host': args.host, 'port': args.port, 'framed': not args.raw, 'rate': args.rate,
+        'duration': args.duration, 'settle': args.settle, 'drain': args.drain,
+        'connect_rate': args.connect_rate / args.processes if args.connect_rate else 0,
+    }
+    try:
+        rss_before = process_tree_rss(server_pid) if server_pid else None
+        results = multiprocessing.Queue()
+        workers = []
+        for p in range(args.processes):
+            clients = args.clients // args.processes + (1 if p < args.clients % args.processes else 0)
+            senders = args.senders // args.processes + (1 if p < args.senders % args.processes else 0)
+            worker = multiprocessing.Process(target=_slice_process,
+                                             args=(config, p * (args.clients // args.processes + 1), clients, senders, results))
+            worker.start()
+            workers.append(worker)
+
+        # Sample server memory once every client is connected and idle
+        rss_connected = None
+        if server_pid:
+            ramp = args.clients / args.connect_rate if args.connect_rate else 0
+            time.sleep(ramp + args.settle * 0.5)
+            rss_connected = process_tree_rss(server_pid)
+
+        histogram = LatencyHistogram()
+        counters = {'connected': 0, 'sent': 0, 'received': 0, 'connect_errors': 0}
+        for _ in workers:
+            part = results.get()
+            for key, value in part['counters'].items():
+                counters[key] += value
+            other = LatencyHistogram({int(k): v for k, v in part['histogram'].items()})
+            other.sum_us, other.max_us = part['sum_us'], part['max_us']
+            histogram.merge(other)
+        for worker in workers:
+            worker.join()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    expected = counters['sent'] * counters['connected']
+    report = {
+        'label': args.label,
+        'commit': _git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {
+            'clients': args.clients, 'senders': args.senders, 'rate_per_sender': args.rate,
+            'duration_s': args.duration, 'protocol': 'raw' if args.raw else 'framed',
+            'processes': args.processes, 'server_args': args.server_arg,
+        },
+        'results': {
+            **counters,
+            'expected_deliveries': expected,
+            'delivery_ratio': round(counters['received'] / expected, 4) if expected else None,
+            'sent_per_s': round(counters['sent'] / args.duration, 1),
+            'delivered_per_s': round(counters['received'] / args.duration, 1),
+            'latency_ms': histogram.summary_ms(),
+        },
+    }
+    if rss_before is not None and rss_connected is not None and counters['connected']:
+        report['results']['server_rss_bytes'] = {'idle': rss_before, 'connected': rss_connected}
+        report['results']['server_bytes_per_client'] = round((rss_connected - rss_before) / counters['connected'])
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator and latency benchmark for the NET322 chat server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=12345)
+    parser.add_argument('--spawn', action='store_true', help="start a local messaging_server.py for the run")
+    parser.add_argument('--server-arg', action='append', default=[],
+                        help="extra argument for the spawned server, repeatable (e.g. --server-arg=--workers=2)")
+    parser.add_argument('--server-pid', type=int, help="pid of an already running server, for memory figures")
+    parser.add_argument('--server-startup', type=float, default=1.0)
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--senders', type=int, default=50)
+    parser.add_argument('--rate', type=float, default=5.0, help="messages per second per sender")
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--settle', type=float, default=1.0, help="pause between connecting and sending")
+    parser.add_argument('--drain', type=float, default=1.0, help="time to keep receiving after sending stops")
+    parser.add_argument('--connect-rate', type=float, default=2000.0, help="new connections per second, 0 = no limit")
+    parser.add_argument('--processes', type=int, default=1, help="load generator processes")
+    parser.add_argument('--raw', action='store_true', help="use the raw-text protocol instead of framing")
+    parser.add_argument('--label', default='')
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
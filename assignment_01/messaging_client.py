@@ -1,10 +1,13 @@
 import sys
+import codecs
 from PyQt5.QtNetwork import QTcpSocket, QHostAddress
-from PyQt5.QtWidgets import QApplication, QWidget, QTextEdit, QLineEdit, QPushButton, QVBoxLayout, QHBoxLayout, QLabel
+from PyQt5.QtWidgets import QApplication, QWidget, QTextEdit, QLineEdit, QPushButton, QVBoxLayout, QHBoxLayout, QLabel, QCheckBox
 from PyQt5.QtCore import pyqtSignal, QObject, QByteArray
 from PyQt5.QtGui import QIcon, QPixmap
 from pathlib import Path
 
+from framing import FrameDecoder, FrameError, MAGIC, MSG_TEXT, encode_frame
+
 ICON_PATH = Path(__file__).parent / "UnimaLogo.png"
 
 class Communicate(QObject):
@@ -15,6 +18,11 @@ class ChatClient(QWidget):
         super().__init__()
         self.comm = Communicate()
         self.comm.message_received.connect(self.display_message)
+        self.framed = False
+        self.handshake_pending = False
+        self.handshake_buffer = b""
+        self.decoder = FrameDecoder()
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')('replace')
         self.initUI()
         self.client_socket = QTcpSocket()
         self.client_socket.connected.connect(self.on_connected)
@@ -33,12 +41,16 @@ class ChatClient(QWidget):
         self.server_ip.setPlaceholderText("Enter Server IP")
         self.server_port = QLineEdit()
         self.server_port.setPlaceholderText("Enter Server port number")
+        # Off by default: a server without framing support would broadcast MAGIC as chat text
+        self.framed_check = QCheckBox('Framed protocol')
+        self.framed_check.setChecked(False)
         self.connect_btn = QPushButton('Connect')
         self.connect_btn.clicked.connect(self.connect_to_server)
         server_layout.addWidget(QLabel('IP:'))
         server_layout.addWidget(self.server_ip)
         server_layout.addWidget(QLabel('Port:'))
         server_layout.addWidget(self.server_port)
+        server_layout.addWidget(self.framed_check)
         server_layout.addWidget(self.connect_btn)
         layout.addLayout(server_layout)
         
@@ -69,8 +81,15 @@ class ChatClient(QWidget):
 
     def on_connected(self):
         self.connect_btn.setEnabled(False)
+        self.framed_check.setEnabled(False)
         self.send_btn.setEnabled(True)
         self.log("Connected to messaging server!")
+        # Ask for the framed protocol; a server that echoes MAGIC back accepted it
+        self.framed = False
+        self.handshake_pending = self.framed_check.isChecked()
+        self.handshake_buffer = b""
+        if self.handshake_pending:
+            self.client_socket.write(QByteArray(MAGIC))
 
     def on_error(self, socket_error):
         self.log(f"Connection error: {self.client_socket.errorString()}")
@@ -88,14 +107,51 @@ class ChatClient(QWidget):
 
     def receive_data(self):
         while self.client_socket.bytesAvailable() > 0:
-            data = self.client_socket.readAll().data().decode('utf-8')
-            self.comm.message_received.emit(data)
+            data = self.client_socket.readAll().data()
+            if self.handshake_pending:
+                data = self.finish_handshake(data)
+                if data is None:
+                    continue
+
+            if not self.framed:
+                # Raw text can still split a UTF-8 sequence across reads
+                text = self.text_decoder.decode(data)
+                if text:
+                    self.comm.message_received.emit(text)
+                continue
+
+            self.decoder.feed(data)
+            try:
+                for msg_type, payload in self.decoder.frames():
+                    self.comm.message_received.emit(str(payload, 'utf-8', 'replace').rstrip('\n'))
+            except FrameError as e:
+                self.log(f"Protocol error: {e}")
+                self.client_socket.disconnectFromHost()
+                return
+
+    def finish_handshake(self, data):
+        # Returns the bytes that follow the handshake, or None while it is incomplete
+        self.handshake_buffer += data
+        if len(self.handshake_buffer) < len(MAGIC) and MAGIC.startswith(self.handshake_buffer):
+            return None
+        data, self.handshake_buffer = self.handshake_buffer, b""
+        self.handshake_pending = False
+        if data.startswith(MAGIC):
+            self.framed = True
+            return data[len(MAGIC):]
+        self.log("Server does not support the framed protocol, using raw text")
+        return data
 
     def send_message(self):
         message = self.message_input.text().strip()
+        if self.handshake_pending:
+            self.log("Still negotiating the protocol with the server, try again in a moment")
+            return
         if message and self.client_socket.state() == QTcpSocket.ConnectedState:
-            data = QByteArray(message.encode('utf-8'))
-            self.client_socket.write(data)
+            payload = message.encode('utf-8')
+            if self.framed:
+                payload = encode_frame(MSG_TEXT, payload)
+            self.client_socket.write(QByteArray(payload))
             self.message_input.clear()
 
     def closeEvent(self, event):
@@ -1,105 +1,276 @@
 import asyncio
 import hashlib
-from typing import List, Dict, Tuple
+import re
+from itertools import count, islice
+from typing import Dict, Iterable, Optional, Tuple
 from datetime import datetime
 
+from broadcast import BroadcastEngine, DROP_OLDEST
+from framing import (FrameDecoder, FrameError, MAGIC, MSG_HISTORY, MSG_SYSTEM, MSG_TEXT,
+                     encode_frame, frame_header, negotiate)
+from history import MessageHistory
+from history_log import HistoryLog
+from idle import IdleWheel
+from registry import ClientRegistry
+from session import ClientSession
+
+HISTORY_REQUEST = re.compile(r'^(history|since)\(\s*(.+?)\s*\)$', re.IGNORECASE)
+
+
+def parse_since(text: str) -> Optional[datetime]:
+    # Accepts a unix timestamp, an ISO date/time or HH:MM[:SS] meaning today
+    try:
+        return datetime.fromtimestamp(float(text))
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        pass
+    for fmt in ('%H:%M:%S', '%H:%M'):
+        try:
+            parsed = datetime.strptime(text, fmt)
+            return datetime.now().replace(hour=parsed.hour, minute=parsed.minute,
+                                          second=parsed.second, microsecond=0)
+        except ValueError:
+            continue
+    return None
+
+
 class ChatServer:
-    def __init__(self):
-        self.clients  : List[asyncio.StreamWriter] = []
-        self.message_history : List[Tuple[str, str, datetime]] = []  # (client_hash, message, timestamp)
-        self.lock = asyncio.Lock()
-        self.client_names : Dict[str, str] = {}  # client_hash -> display name
+    def __init__(self, history_size: int = 100, queue_size: int = 256,
+                 queue_bytes: int = 1 << 20, slow_client_policy: str = DROP_OLDEST,
+                 negotiate_timeout: float = 0.25, batch_window: float = 0.0,
+                 batch_bytes: int = 64 * 1024, history_dir: Optional[str] = None,
+                 idle_timeout: float = 300.0, idle_granularity: float = 1.0,
+                 history_retain_seconds: Optional[float] = None,
+                 history_max_segments: Optional[int] = None):
+        # session id -> session, read through lock-free snapshots
+        self.clients : ClientRegistry[ClientSession] = ClientRegistry()
+        self._session_ids = count(1)
+        # Encode-once fan-out into bounded per-client send queues, optionally
+        # micro-batched over batch_window seconds (e.g. 0.002 - 0.005)
+        self.broadcaster = BroadcastEngine(queue_size, queue_bytes, slow_client_policy,
+                                           batch_window, batch_bytes, targets=self.clients.snapshot)
+        self.client_names : Dict[str, str] = {}  # client_hash -> display name, for history lines
+        # (client_hash, message, timestamp) ring buffer with pre-encoded lines for replay
+        self.message_history = MessageHistory(history_size, resolve_name=self.display_name)
+        # How long a new connection may take to send the framing handshake
+        self.negotiate_timeout = negotiate_timeout
+        # Disconnects clients idle for idle_timeout seconds (300 = 5 minutes),
+        # checked in batches every idle_granularity seconds
+        self.idle_wheel = IdleWheel(idle_timeout, idle_granularity, on_expire=self.reap_idle)
+        # Cross-worker message bus when running as part of a ChatCluster
+        self.bus = None
+        # Optional on-disk log that outlives restarts and serves history(N) / since(...),
+        # compacted down to the last history_retain_seconds / history_max_segments
+        self.history_log = HistoryLog(history_dir, retain_seconds=history_retain_seconds,
+                                      max_segments=history_max_segments) if history_dir else None
+
+    def display_name(self, client_hash: str) -> str:
+        return self.client_names.get(client_hash, client_hash)
+
+    def set_display_name(self, client_hash: str, name: str):
+        self.client_names[client_hash] = name
+        for session in self.clients.snapshot():
+            if session.client_hash == client_hash:
+                session.name = name
+        # Only the history lines written by this client need re-formatting
+        self.message_history.invalidate(client_hash)
     
     async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
         addr = writer.get_extra_info('peername')
         ip, port = addr
+        # Displayed identity only; sessions are keyed by a small integer id
         client_hash = hashlib.sha1(f"{ip} : {port}".encode()).hexdigest()[:8]
-        
-        async with self.lock:
-            self.clients.append(writer)
-            # Send welcome message and history to new client
-            welcome_msg = f"Welcome to the chat! Your ID: {client_hash}\nEnter close() or quit() or exit() to close the connection!"
+
+        # Framed clients announce themselves with MAGIC; anything else is a raw-text
+        # client whose first bytes are kept as the start of its first message
+        try:
+            framed, pending = await negotiate(reader, self.negotiate_timeout)
+        except ConnectionError:
+            writer.close()
+            return
+        # Start small; the receive buffer grows if a client sends large frames
+        decoder = FrameDecoder(initial_size=4096) if framed else None
+
+        session = self.broadcaster.open_session(next(self._session_ids), client_hash, writer)
+        session.framed = framed
+        self.clients.add(session.id, session)
+
+        # Send welcome message and history to new client. Nothing awaits between
+        # registering the client and queueing the replay, so no broadcast can slip
+        # in ahead of the history.
+        welcome_msg = f"Welcome to the chat! Your ID: {client_hash}\nEnter close() or quit() or exit() to close the connection!\nEnter history(N) or since(HH:MM) to replay older messages."
+        history = self.message_history.snapshot()
+        if framed:
+            writer.writelines([MAGIC, encode_frame(MSG_SYSTEM, welcome_msg.encode())])
+            if history:
+                frames = [encode_frame(MSG_SYSTEM, b"---Start of Message History ---")]
+                for line in history:
+                    frames += (frame_header(MSG_HISTORY, len(line)), line)
+                frames.append(encode_frame(MSG_SYSTEM, b"--- End of History ---"))
+                writer.writelines(frames)
+        else:
             writer.write(welcome_msg.encode())
-            await writer.drain()
-            
+
             # Send message exchange history
-            if self.message_history:
-                history_header = "\n---Start of Message History ---\n"
-                writer.write(history_header.encode())
-                for hash_, msg, timestamp in self.message_history:
-                    display_name = self.client_names.get(hash_, hash_)
-                    formatted = f"[{timestamp.strftime('%H:%M:%S')}] {display_name}: {msg}\n"
-                    writer.write(formatted.encode())
-                writer.write("--- End of History ---\n\n".encode())
-                await writer.drain()
+            if history:
+                writer.writelines([b"\n---Start of Message History ---\n", *history, b"--- End of History ---\n\n"])
+        await writer.drain()
         
-        print(f"New connection: {addr} as {client_hash}")
+        print(f"New connection: {addr} as {client_hash}{' (framed)' if framed else ''}")
         
+        # Idle clients are reaped by the timing wheel, which closes the transport
+        # and so ends the read below with EOF
+        self.idle_wheel.add(session)
+        read_size = 65536 if framed else 1024
         try:
             while True:
-                try:
-                    # Add timeout for idle clients (300 seconds = 5 minutes)
-                    data = await asyncio.wait_for(reader.read(1024), timeout=300)
-                    if not data:
-                        break
-                    
-                    message = data.decode().strip()
-                    if not message:
-                        continue
-                        
-                    if message.lower() in ("quit()", "close()", "exit()"):
-                        print(f"Client {client_hash} requested disconnection!")
-                        break
-                    
-                    timestamp = datetime.now()
-                    display_name = self.client_names.get(client_hash, client_hash)
-                    formatted = f"[{timestamp.strftime('%H:%M:%S')}] {display_name}: {message}\n"
-                    
-                    # Add to history before broadcasting
-                    async with self.lock:
-                        self.message_history.append((client_hash, message, timestamp))
-                        if len(self.message_history) > 100:  # Keep last 100 messages
-                            self.message_history.pop(0)
-                    
-                    await self.broadcast(formatted, sender=writer)
-                    
-                except asyncio.TimeoutError:
-                    print(f"Client {client_hash} disconnected due to inactivity")
+                if pending:
+                    data, pending = pending, b""
+                else:
+                    data = await reader.read(read_size)
+                if not data:
+                    if session.timed_out:
+                        print(f"Client {client_hash} disconnected due to inactivity")
+                    break
+                self.idle_wheel.touch(session)
+
+                if decoder is None:
+                    messages = [data.decode(errors='replace').strip()]
+                else:
+                    decoder.feed(data)
+                    messages = [str(payload, 'utf-8', 'replace').strip()
+                                for msg_type, payload in decoder.frames() if msg_type == MSG_TEXT]
+                session.messages_in += len(messages)
+
+                if not await self.process_messages(session, messages):
                     break
                     
+        except FrameError as e:
+            print(f"Client {client_hash} sent a malformed frame: {e}")
         except (ConnectionError, asyncio.CancelledError) as e:
             print(f"Client {client_hash} disconnected: {e}")
         finally:
-            async with self.lock:
-                if writer in self.clients:
-                    self.clients.remove(writer)
-            writer.close()
-            await writer.wait_closed()
-            print(f"Connection closed: {client_hash}")
+            self.idle_wheel.remove(session)
+            self.clients.remove(session.id, session)
+            await self.close_session(session)
+            print(f"Connection closed: {client_hash} (sent {session.sent}, dropped {session.drops})")
     
-    async def broadcast(self, message: str, sender: asyncio.StreamWriter):
-        async with self.lock:
-            clients_copy = self.clients.copy()
-        
-        tasks = []
-        for client in clients_copy:
-            try:
-                client.write(message.encode())
-                tasks.append(client.drain())
-            except ConnectionError:
-                async with self.lock:
-                    if client in self.clients:
-                        self.clients.remove(client)
-                client.close()
-                await client.wait_closed()
+    async def close_session(self, session: ClientSession, timeout: float = 5.0):
+        # Flush what is buffered, but don't wait forever on a client that stopped reading
+        session.close()
+        try:
+            await asyncio.wait_for(session.writer.wait_closed(), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            session.close(abort=True)
+        except ConnectionError:
+            pass
+
+    def reap_idle(self, sessions):
+        for session in sessions:
+            session.timed_out = True
+            session.close(abort=True)
+
+    async def process_messages(self, session: ClientSession, messages) -> bool:
+        # Returns False once the client asks to disconnect
+        client_hash = session.client_hash
+        for message in messages:
+            if not message:
+                continue
+                
+            if message.lower() in ("quit()", "close()", "exit()"):
+                print(f"Client {client_hash} requested disconnection!")
+                return False
+
+            request = HISTORY_REQUEST.match(message)
+            if request:
+                await self.send_history(session, *request.groups())
+                continue
+            
+            if self.bus is not None:
+                # The bus hands the message back to every worker, this one included,
+                # in one global order so all histories stay identical
+                self.bus.publish(client_hash, message, datetime.now())
+            else:
+                await self.deliver(client_hash, message, datetime.now())
+        return True
+
+    async def deliver(self, client_hash: str, message: str, timestamp: datetime):
+        # Add to history before broadcasting; the oldest entry is evicted once full
+        formatted = self.message_history.append(client_hash, message, timestamp)
+        if self.history_log is not None:
+            self.history_log.append(client_hash, message, timestamp)
         
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
+        await self.broadcast(formatted)
+
+    async def send_history(self, session: ClientSession, command: str, argument: str):
+        # history(N) -> last N messages, since(T) -> messages at or after T. Records
+        # stream from the log (or the in-memory history) straight to this client.
+        records: Iterable[Tuple[str, str, datetime]]
+        if command.lower() == 'history':
+            if not argument.isdigit():
+                session.writer.write(self._notice(session, f"history() expects a message count, got {argument!r}\n"))
+                return
+            count = int(argument)
+            if self.history_log is not None:
+                records = self.history_log.tail(count)
+            else:
+                entries = self.message_history.entries()
+                records = entries[-count:] if count else []
+        else:
+            since = parse_since(argument)
+            if since is None:
+                session.writer.write(self._notice(session, f"Cannot parse time {argument!r}, use HH:MM[:SS], ISO format or a unix timestamp\n"))
+                return
+            if self.history_log is not None:
+                records = self.history_log.since(since)
+            else:
+                records = (entry for entry in self.message_history if entry[2] >= since)
+
+        writer = session.writer
+        records = iter(records)
+        while True:
+            chunk = [self.message_history.format(*record).encode() for record in islice(records, 256)]
+            if not chunk:
+                break
+            if session.framed:
+                writer.writelines([part for line in chunk for part in (frame_header(MSG_HISTORY, len(line)), line)])
+            else:
+                writer.writelines(chunk)
+            await writer.drain()
+
+    @staticmethod
+    def _notice(session: ClientSession, text: str) -> bytes:
+        return encode_frame(MSG_SYSTEM, text.encode()) if session.framed else text.encode()
+
+    async def broadcast(self, message, sender: asyncio.StreamWriter = None):
+        # Encode once (plus one framed copy); each client's writer task drains its
+        # own queue, so a slow reader never holds up the sender
+        data = message.encode() if isinstance(message, str) else message
+        self.broadcaster.publish(data, frame_header(MSG_TEXT, len(data)) + data)
+
+    def client_stats(self) -> Dict[int, Dict[str, int]]:
+        # Per-session queue depth, peak depth, message and drop counts
+        return {session_id: session.stats() for session_id, session in self.clients.items()}
+
+    def batch_stats(self) -> Dict[str, float]:
+        # Batch size and added latency figures for tuning batch_window
+        return self.broadcaster.batch_stats.summary()
+
+    async def run(self, host: str = '127.0.0.1', port: int = 12345, reuse_port: bool = False):
+        if self.history_log is not None:
+            await self.history_log.open()
+            # Seed the in-memory replay buffer from the persisted log
+            for record in self.history_log.tail(self.message_history.capacity):
+                self.message_history.append(*record)
+            print(f"Loaded {len(self.history_log)} logged messages from {self.history_log.directory}")
 
-    async def run(self, host: str = '127.0.0.1', port: int = 12345):
         server = await asyncio.start_server(
-            self.handle_client, host, port
+            self.handle_client, host, port, reuse_port=reuse_port or None
         )
+        self.idle_wheel.start()
         
         print(f"Server running on {host} : {port}")
         print("Press Ctrl+C to stop the server")
@@ -109,16 +280,40 @@ class ChatServer:
                 await server.serve_forever()
             except asyncio.CancelledError:
                 print("\nServer is shutting down...")
-                # Close all client connections
-                async with self.lock:
-                    for writer in self.clients:
-                        writer.close()
-                        await writer.wait_closed()
+                await self.idle_wheel.stop()
+                # Deliver anything still waiting in a batch, then close all client connections
+                self.broadcaster.flush()
+                await asyncio.gather(*(self.close_session(session, timeout=1.0)
+                                       for session in self.clients.snapshot()))
+                if self.history_log is not None:
+                    await self.history_log.close()
                 print("All connections closed.")
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="NET322 messaging server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=12345)
+    parser.add_argument('--workers', type=int, default=1,
+                        help="worker processes sharing the port with SO_REUSEPORT")
+    parser.add_argument('--history-dir', help="keep a persistent message log in this directory")
+    parser.add_argument('--history-retain', type=float, metavar='SECONDS',
+                        help="delete logged messages older than this")
+    parser.add_argument('--history-max-segments', type=int, metavar='N',
+                        help="keep at most N log segment files (8 MiB each)")
+    args = parser.parse_args()
+
     try:
-        server = ChatServer()
-        asyncio.run(server.run())
+        if args.workers > 1:
+            from cluster import ChatCluster
+            if args.history_dir:
+                parser.error("--history-dir is only supported with a single worker")
+            asyncio.run(ChatCluster(args.workers, args.host, args.port).run())
+        else:
+            server = ChatServer(history_dir=args.history_dir,
+                                history_retain_seconds=args.history_retain,
+                                history_max_segments=args.history_max_segments)
+            asyncio.run(server.run(args.host, args.port))
     except KeyboardInterrupt:
-        print("\nServer shutdown complete.")
\ No newline at end of file
+        print("\nServer shutdown complete.")
@@ -0,0 +1,48 @@
+from typing import Dict, Generic, Iterator, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+
+
+class ClientRegistry(Generic[T]):
+    # Connected clients keyed by their integer session id. Joins and leaves are O(1) dict
+    # operations; readers get an immutable tuple snapshot that is rebuilt at most
+    # once per membership change, so broadcasts never need a lock and a client
+    # that leaves mid-broadcast simply finishes receiving from the old snapshot.
+    def __init__(self):
+        self._clients: Dict[int, T] = {}
+        self._snapshot: Optional[Tuple[T, ...]] = ()
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def __contains__(self, client_id: int) -> bool:
+        return client_id in self._clients
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(self.snapshot())
+
+    def get(self, client_id: int) -> Optional[T]:
+        return self._clients.get(client_id)
+
+    def add(self, client_id: int, client: T):
+        if client_id in self._clients:
+            raise KeyError(f"Client {client_id} is already registered")
+        self._clients[client_id] = client
+        self._snapshot = None
+
+    def remove(self, client_id: int, client: Optional[T] = None) -> Optional[T]:
+        # With `client` given, only remove the entry if it is still that object
+        current = self._clients.get(client_id)
+        if current is None or (client is not None and current is not client):
+            return None
+        del self._clients[client_id]
+        self._snapshot = None
+        return current
+
+    def snapshot(self) -> Tuple[T, ...]:
+        if self._snapshot is None:
+            self._snapshot = tuple(self._clients.values())
+        return self._snapshot
+
+    def items(self):
+        return self._clients.items()
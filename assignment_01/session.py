@@ -0,0 +1,143 @@
+import asyncio
+from collections import deque
+from typing import Deque, Dict, Optional
+
+# What to do when a client's outbound queue is full
+DROP_OLDEST = 'drop_oldest'  # evict the oldest queued message
+DISCONNECT = 'disconnect'    # treat the client as dead and close it
+COALESCE = 'coalesce'        # merge the backlog into a single buffer
+POLICIES = (DROP_OLDEST, DISCONNECT, COALESCE)
+
+# Writes go straight to the transport while its buffer holds less than this;
+# matches asyncio's default high-water mark
+DIRECT_WRITE_LIMIT = 64 * 1024
+
+
+class SendLimits:
+    # Outbound queue bounds and slow-consumer policy shared by all sessions
+    __slots__ = ('max_messages', 'max_bytes', 'policy')
+
+    def __init__(self, max_messages: int, max_bytes: int, policy: str):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.policy = policy
+
+
+class ClientSession:
+    # All per-connection state in one compact object. The integer id is the
+    # client's identity; client_hash only exists for display.
+    #
+    # An idle session owns no queue and no task: sends go straight to the
+    # transport while it keeps up, and only a client that falls behind gets a
+    # bounded backlog plus a writer task that drains it and then exits.
+    __slots__ = ('id', 'client_hash', 'name', 'writer', 'limits', 'framed',
+                 'queue', 'queued_bytes', 'messages_in', 'sent', 'drops', 'peak_depth',
+                 'last_activity', 'timed_out', 'closed', '_task')
+
+    def __init__(self, session_id: int, client_hash: str, writer: asyncio.StreamWriter, limits: SendLimits):
+        self.id = session_id
+        self.client_hash = client_hash
+        self.name = client_hash  # display name
+        self.writer = writer
+        self.limits = limits
+        self.framed = False  # client negotiated the length-prefixed protocol
+        self.queue: Optional[Deque[bytes]] = None
+        self.queued_bytes = 0
+        self.messages_in = 0
+        self.sent = 0
+        self.drops = 0
+        self.peak_depth = 0
+        self.last_activity = 0.0  # maintained by the server's IdleWheel
+        self.timed_out = False
+        self.closed = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return len(self.queue) if self.queue else 0
+
+    def send(self, data: bytes) -> bool:
+        # Never blocks; returns False if the client is (or has just been) disconnected
+        if self.closed:
+            return False
+
+        if self.queue is None:
+            transport = self.writer.transport
+            if transport.is_closing():
+                # Peer already gone; the read loop will notice EOF and unregister us
+                self.closed = True
+                return False
+            if transport.get_write_buffer_size() < DIRECT_WRITE_LIMIT:
+                self.writer.write(data)
+                self.sent += 1
+                return True
+            self.queue = deque()
+            self._task = asyncio.create_task(self._drain_queue())
+
+        self.queue.append(data)
+        self.queued_bytes += len(data)
+        limits = self.limits
+        if len(self.queue) > limits.max_messages or self.queued_bytes > limits.max_bytes:
+            self._overflow()
+            if self.closed:
+                return False
+
+        if len(self.queue) > self.peak_depth:
+            self.peak_depth = len(self.queue)
+        return True
+
+    def _overflow(self):
+        limits = self.limits
+        queue = self.queue
+        if limits.policy == DROP_OLDEST:
+            while len(queue) > 1 and (len(queue) > limits.max_messages or self.queued_bytes > limits.max_bytes):
+                self.queued_bytes -= len(queue.popleft())
+                self.drops += 1
+            if self.queued_bytes > limits.max_bytes:  # a single message larger than the byte budget
+                self.queued_bytes -= len(queue.popleft())
+                self.drops += 1
+        elif limits.policy == COALESCE and self.queued_bytes <= limits.max_bytes:
+            merged = b"".join(queue)
+            queue.clear()
+            queue.append(merged)
+        else:
+            # DISCONNECT, or a coalesced backlog that outgrew its byte budget
+            self.drops += len(queue)
+            self.close(abort=True)
+
+    async def _drain_queue(self):
+        try:
+            while True:
+                await self.writer.drain()
+                if not self.queue:
+                    break
+                batch = list(self.queue)
+                self.queue.clear()
+                self.queued_bytes = 0
+                self.writer.writelines(batch)
+                self.sent += len(batch)
+        except (ConnectionError, asyncio.CancelledError):
+            self.closed = True
+        finally:
+            # Caught up (or gone): back to direct writes with no task or queue
+            self.queue = None
+            self.queued_bytes = 0
+            self._task = None
+
+    def close(self, abort: bool = False):
+        # abort=True discards unsent data; a graceful close of a client that has
+        # stopped reading would otherwise wait on its full buffer indefinitely
+        if self.closed and not abort:
+            return
+        self.closed = True
+        if self._task is not None:
+            self._task.cancel()
+        # Closing the transport also ends the handler's read loop with EOF
+        if abort:
+            self.writer.transport.abort()
+        else:
+            self.writer.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {'hash': self.client_hash, 'messages_in': self.messages_in, 'depth': self.depth,
+                'peak_depth': self.peak_depth, 'sent': self.sent, 'drops': self.drops}
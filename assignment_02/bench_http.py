@@ -0,0 +1,250 @@
+# HTTP benchmark for the assignment 2 server.
+#
+# Starts server.py from --src in a child process on a spare port, then keeps
+# --concurrency keep-alive requests in flight against each path for --duration
+# seconds and reports requests per second and latency percentiles. To compare
+# with an older revision, point --src at a checkout of it, e.g.
+#
+#     git worktree add /tmp/server-before HEAD~1
+#     python bench_http.py --src /tmp/server-before/assignment_02
+#
+# For worker scaling, run the cluster with enough client processes to load it:
+#
+#     for n in 1 2 4; do python bench_http.py --workers $n --client-processes 4; done
+import argparse
+import ast
+import asyncio
+import importlib
+import itertools
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def serve(src: str, host: str, port: int, db_file: str, server_args: List[str], workers: int):
+    # Child process: run the server module from `src` on the given port, with
+    # registrations going to a scratch file instead of the real db.txt
+    sys.path.insert(0, os.path.abspath(src))
+    os.chdir(src)
+    server = importlib.import_module('server')
+    server.DB_FILE = db_file
+    kwargs = {}
+    for arg in server_args:
+        name, _, value = arg.partition('=')
+        try:
+            kwargs[name] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            kwargs[name] = value
+    if workers > 1:
+        # Worker processes import server afresh, so they get the scratch file explicitly
+        cluster = importlib.import_module('cluster').WebCluster(workers, host, port, db_file=db_file, **kwargs)
+        try:
+            asyncio.run(cluster.run())
+        except KeyboardInterrupt:
+            pass
+        return
+    from aiohttp import web
+    web.run_app(server.init_app(**kwargs), host=host, port=port, print=None, access_log=None)
+
+
+async def wait_for_server(host: str, port: int, timeout: float):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+async def fetch(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, request: bytes) -> Tuple[int, int]:
+    # One keep-alive request; a deliberately small client so the server is what gets measured
+    writer.write(request)
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head[9:12])
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line[:15].lower() == b"content-length:":
+            length = int(line[15:])
+            break
+    await reader.readexactly(length)
+    return status, length
+
+
+def build_request(host: str, port: int, path: str, headers: List[str], data: Optional[str], n: int) -> bytes:
+    extra = "".join(f"{header}\r\n" for header in headers)
+    if data is None:
+        return f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n{extra}\r\n".encode()
+    body = data.replace('{n}', str(n)).encode()
+    return (f"POST {path} HTTP/1.1\r\nHost: {host}:{port}\r\n{extra}"
+            f"Content-Type: application/x-www-form-urlencoded\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body
+
+
+async def load(host: str, port: int, path: str, concurrency: int, duration: float,
+               headers: List[str] = (), data: Optional[str] = None, first: int = 0) -> Dict[str, object]:
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    errors = 0
+    body_bytes = 0
+    request = build_request(host, port, path, headers, None, 0)
+    # POST bodies may number each request with {n}, e.g. to make usernames unique
+    counter = itertools.count(first)
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors, body_bytes
+        connection = None
+        while True:
+            start = time.perf_counter()
+            if start >= deadline:
+                break
+            try:
+                if connection is None:
+                    connection = await asyncio.open_connection(host, port)
+                payload = request if data is None else build_request(host, port, path, headers, data, next(counter))
+                status, length = await fetch(*connection, payload)
+            except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+                errors += 1
+                if connection is not None:
+                    connection[1].close()
+                connection = None
+                continue
+            statuses[status] = statuses.get(status, 0) + 1
+            body_bytes += length
+            latencies.append(time.perf_counter() - start)
+        if connection is not None:
+            connection[1].close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {'latencies': latencies, 'statuses': statuses, 'errors': errors,
+            'body_bytes': body_bytes, 'elapsed': elapsed}
+
+
+def load_in_process(*load_args) -> Dict[str, object]:
+    return asyncio.run(load(*load_args))
+
+
+def summarise(parts: List[Dict[str, object]]) -> Dict[str, object]:
+    # Merge the raw results of one or more client processes
+    latencies = sorted(latency for part in parts for latency in part['latencies'])
+    statuses: Dict[int, int] = {}
+    for part in parts:
+        for status, count in part['statuses'].items():
+            statuses[status] = statuses.get(status, 0) + count
+    elapsed = max(part['elapsed'] for part in parts)
+    body_bytes = sum(part['body_bytes'] for part in parts)
+    return {
+        'requests': len(latencies),
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'bytes_per_request': body_bytes / len(latencies) if latencies else 0,
+        'statuses': statuses,
+        'errors': sum(part['errors'] for part in parts),
+    }
+
+
+async def run(args, port: int):
+    await wait_for_server(args.host, port, args.startup)
+    loop = asyncio.get_running_loop()
+    # Generating load costs about as much CPU as serving it, so a multi-core run
+    # needs several client processes to keep a multi-worker server busy
+    clients = args.client_processes
+    per_client = max(1, args.concurrency // clients)
+    results = []
+    with ProcessPoolExecutor(clients, mp_context=multiprocessing.get_context('spawn')) as pool:
+        for path in args.paths:
+            if args.data is None:
+                # A short warm-up so connection setup is not part of the measurement
+                await asyncio.gather(*(loop.run_in_executor(
+                    pool, load_in_process, args.host, port, path, per_client,
+                    min(1.0, args.duration / 5), args.header) for _ in range(clients)))
+            parts = await asyncio.gather(*(loop.run_in_executor(
+                pool, load_in_process, args.host, port, path, per_client, args.duration,
+                args.header, args.data, index * 1_000_000_000) for index in range(clients)))
+            results.append((path, summarise(parts)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Requests per second against the assignment 2 server")
+    parser.add_argument('--src', default=os.path.dirname(os.path.abspath(__file__)),
+                        help="directory holding the server.py to measure")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--paths', default='/,/register.html', help="comma separated paths to request")
+    parser.add_argument('--header', action='append', default=[],
+                        help="extra request header, repeatable (e.g. --header 'Accept-Encoding: gzip')")
+    parser.add_argument('--data', help="send POSTs with this form body instead of GETs; "
+                                       "{n} is replaced by a per-request counter")
+    parser.add_argument('--concurrency', type=int, default=64, help="requests in flight, over all client processes")
+    parser.add_argument('--client-processes', type=int, default=1)
+    parser.add_argument('--duration', type=float, default=5.0, help="seconds per path")
+    parser.add_argument('--startup', type=float, default=10.0, help="seconds to wait for the server")
+    parser.add_argument('--server-arg', action='append', default=[],
+                        help="keyword argument for server.py's init_app as NAME=VALUE, repeatable "
+                             "(e.g. --server-arg fsync=never)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="run the server as a multi-process cluster (needs cluster.py in --src)")
+    parser.add_argument('--serve', type=int, metavar='PORT', help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.src, args.host, args.serve, args.db, args.server_arg, args.workers)
+        return
+
+    args.paths = args.paths.split(',')
+    port = free_port()
+    with tempfile.TemporaryDirectory() as scratch:
+        db_file = os.path.join(scratch, 'db.txt')
+        child = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--src', args.src,
+                                  '--host', args.host, '--serve', str(port), '--db', db_file,
+                                  '--workers', str(args.workers),
+                                  *(f'--server-arg={arg}' for arg in args.server_arg)])
+        try:
+            results = asyncio.run(run(args, port))
+        finally:
+            # SIGINT rather than SIGTERM so a cluster supervisor shuts its workers down too
+            child.send_signal(signal.SIGINT)
+            child.wait()
+        registrations = sum(1 for _ in open(db_file, 'rb')) if os.path.exists(db_file) else 0
+
+    print(f"{args.src} ({args.concurrency} concurrent requests, {args.duration:g}s per path"
+          f"{f', {args.workers} workers' if args.workers > 1 else ''})")
+    for header in args.header:
+        print(f"  {header}")
+    if args.data is not None:
+        print(f"  POST {args.data}  ({registrations} lines written)")
+    for path, result in results:
+        print(f"  {path:<16} {result['rps']:9.0f} req/s   p50 {result['p50_ms']:6.2f} ms"
+              f"   p99 {result['p99_ms']:6.2f} ms   {result['bytes_per_request']:6.0f} B/resp   statuses {result['statuses']}"
+              + (f"   errors {result['errors']}" if result['errors'] else ""))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# Micro-benchmark: cost of the metrics middleware per request.
+#
+# Calls a trivial handler directly and through Metrics.middleware (plus the
+# response-prepare hook) on a request already resolved against a real route,
+# and reports the difference in nanoseconds per request. For the end-to-end
+# view, compare bench_http.py with and without --server-arg metrics=False.
+import argparse
+import asyncio
+import time
+
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+from metrics import Metrics
+
+
+async def handler(request):
+    return web.Response(body=b"ok")
+
+
+async def time_calls(call, request, iterations: int) -> float:
+    start = time.perf_counter_ns()
+    for _ in range(iterations):
+        await call(request)
+    return (time.perf_counter_ns() - start) / iterations
+
+
+async def run(iterations: int, rounds: int):
+    app = web.Application()
+    app.router.add_get('/register.html', handler)
+    metrics = Metrics()
+    request = make_mocked_request('GET', '/register.html', app=app)
+    match_info = await app.router.resolve(request)
+    match_info.add_app(app)
+    request._match_info = match_info
+
+    async def instrumented(request):
+        response = await metrics.middleware(request, handler)
+        await metrics.on_response_prepare(request, response)
+        return response
+
+    bare, timed = [], []
+    for _ in range(rounds):
+        bare.append(await time_calls(handler, request, iterations))
+        timed.append(await time_calls(instrumented, request, iterations))
+    # Best of N rounds: the least disturbed run of each
+    print(f"handler alone:        {min(bare):7.0f} ns/request")
+    print(f"with metrics:         {min(timed):7.0f} ns/request")
+    print(f"middleware overhead:  {min(timed) - min(bare):7.0f} ns/request")
+    assert metrics.unmatched.latency.count == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request cost of the metrics middleware")
+    parser.add_argument('--iterations', type=int, default=200_000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.iterations, args.rounds))
+
+
+if __name__ == '__main__':
+    main()
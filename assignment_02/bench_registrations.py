@@ -0,0 +1,106 @@
+# Registration store benchmark: index rebuild time and lookup latency.
+#
+# Writes --count synthetic registrations to a scratch db.txt in the server's
+# "username  email" format, rebuilds a RegistrationStore from it and times
+# lookups and duplicate checks against the indexes. For comparison it also
+# times the old way of answering "is this name taken?": scanning the file.
+import argparse
+import asyncio
+import os
+import random
+import resource
+import tempfile
+import time
+from typing import List
+
+from registration_store import DuplicateRegistration, RegistrationStore, parse_line
+from registration_writer import FSYNC_NEVER, RegistrationWriter
+
+
+def write_log(path: str, count: int):
+    with open(path, 'w', encoding='utf-8') as f:
+        for start in range(0, count, 100_000):
+            f.write("".join(f"user{i}  user{i}@example.com\n" for i in range(start, min(count, start + 100_000))))
+
+
+def scan_for(path: str, username: str) -> bool:
+    key = username.casefold()
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            registration = parse_line(line)
+            if registration is not None and registration[0].casefold() == key:
+                return True
+    return False
+
+
+def summary(samples_ns: List[int]) -> str:
+    samples_ns.sort()
+    p50 = samples_ns[len(samples_ns) // 2] / 1000
+    p99 = samples_ns[min(len(samples_ns) - 1, int(len(samples_ns) * 0.99))] / 1000
+    return f"p50 {p50:7.2f} us   p99 {p99:7.2f} us"
+
+
+async def run(args, path: str):
+    rng = random.Random(args.seed)
+    writer = RegistrationWriter(path, fsync=FSYNC_NEVER)
+    store = RegistrationStore(path, writer)
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    await store.ready()
+    rebuild = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"rebuild:          {rebuild * 1000:9.1f} ms for {len(store)} registrations"
+          f"   (peak RSS +{(rss_after - rss_before) / 1024:.0f} MiB)")
+
+    hits, misses, duplicates = [], [], []
+    for _ in range(args.lookups):
+        name = f"USER{rng.randrange(args.count)}"
+        t0 = time.perf_counter_ns()
+        found = await store.lookup(username=name)
+        hits.append(time.perf_counter_ns() - t0)
+        assert found is not None
+
+        t0 = time.perf_counter_ns()
+        found = await store.lookup(email=f"nobody{rng.randrange(args.count)}@example.com")
+        misses.append(time.perf_counter_ns() - t0)
+        assert found is None
+
+        t0 = time.perf_counter_ns()
+        try:
+            await store.register(name.lower(), f"fresh{rng.random()}@example.com")
+        except DuplicateRegistration:
+            pass
+        else:
+            raise AssertionError("duplicate was accepted")
+        duplicates.append(time.perf_counter_ns() - t0)
+
+    print(f"lookup (hit):     {summary(hits)}")
+    print(f"lookup (miss):    {summary(misses)}")
+    print(f"duplicate reject: {summary(duplicates)}")
+
+    scans = []
+    for _ in range(args.scans):
+        t0 = time.perf_counter_ns()
+        scan_for(path, f"user{rng.randrange(args.count)}")
+        scans.append(time.perf_counter_ns() - t0)
+    print(f"file scan:        {summary(scans)}   ({args.scans} scans, for comparison)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Registration index rebuild and lookup benchmark")
+    parser.add_argument('--count', type=int, default=1_000_000, help="registrations in the log")
+    parser.add_argument('--lookups', type=int, default=100_000)
+    parser.add_argument('--scans', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=322)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, 'db.txt')
+        write_log(path, args.count)
+        print(f"{args.count} registrations, {os.path.getsize(path) / (1 << 20):.1f} MiB log")
+        asyncio.run(run(args, path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+# Local search benchmark: index build, reload and query latency.
+#
+# Generates --pages synthetic HTML pages (Zipf-distributed vocabulary, so some
+# terms appear on nearly every page and most on a few) in a scratch templates
+# directory, builds a SearchIndex over them and times the cold build, a warm
+# start from the saved index, a warm start after a few pages changed, and
+# queries of one to three terms (uncached, then a repetitive stream through
+# the query cache), and URL-bar completions for one to four
+# typed characters. For comparison it also times the old search: a linear
+# substring match over every page's title and path.
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+from completer import Completer
+from search_index import SearchIndex
+
+
+def vocabulary(size: int, rng: random.Random) -> List[str]:
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(3, 10))))
+    return sorted(words)
+
+
+def write_pages(directory: str, count: int, words: List[str], weights: List[float], rng: random.Random):
+    for i in range(count):
+        sub = os.path.join(directory, f"section{i % 20}")
+        os.makedirs(sub, exist_ok=True)
+        title = " ".join(rng.choices(words, weights, k=3))
+        paragraphs = "".join(f"<p>{' '.join(rng.choices(words, weights, k=rng.randint(40, 120)))}</p>\n"
+                             for _ in range(rng.randint(2, 6)))
+        with open(os.path.join(sub, f"page_{i}.html"), 'w', encoding='utf-8') as f:
+            f.write(f"<!DOCTYPE html><html><head><title>{title}</title>"
+                    f"<style>body {{ font-family: sans-serif; }}</style></head>\n"
+                    f"<body><h1>{title}</h1>\n{paragraphs}<script>console.log('page {i}');</script></body></html>\n")
+
+
+def linear_search(pages: List[dict], query: str) -> list:
+    return [page for page in pages if query.lower() in page['title'].lower() or query.lower() in page['path'].lower()]
+
+
+def summary(samples_ns: List[int]) -> str:
+    samples_ns.sort()
+    p50 = samples_ns[len(samples_ns) // 2] / 1000
+    p99 = samples_ns[min(len(samples_ns) - 1, int(len(samples_ns) * 0.99))] / 1000
+    return f"p50 {p50:7.2f} us   p99 {p99:7.2f} us"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local search index build and query benchmark")
+    parser.add_argument('--pages', type=int, default=5000)
+    parser.add_argument('--vocabulary', type=int, default=20000, help="distinct words in the generated pages")
+    parser.add_argument('--queries', type=int, default=5000)
+    parser.add_argument('--changed', type=int, default=10, help="pages touched before the incremental reload")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="parse the cold build in a process pool of this size (0: in this process)")
+    parser.add_argument('--seed', type=int, default=322)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    words = vocabulary(args.vocabulary, rng)
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_pages(directory, args.pages, words, weights, rng)
+
+        executor = None
+        if args.workers:
+            executor = ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context('spawn'))
+        start = time.perf_counter()
+        index = SearchIndex.open(directory, executor=executor)
+        build = time.perf_counter() - start
+        if executor is not None:
+            executor.shutdown()
+        size = os.path.getsize(index.index_path)
+        print(f"cold build:        {build * 1000:9.1f} ms for {len(index)} pages, {len(index.vocabulary())} terms"
+              f"   ({size / (1 << 20):.1f} MiB index, {args.workers or 'no'} workers)")
+
+        start = time.perf_counter()
+        index = SearchIndex.open(directory)
+        print(f"warm start:        {(time.perf_counter() - start) * 1000:9.1f} ms   ({index.parsed} pages parsed)")
+
+        for path in rng.sample(sorted(index.by_path), min(args.changed, len(index))):
+            with open(os.path.join(directory, path), 'a', encoding='utf-8') as f:
+                f.write(f"<p>{' '.join(rng.choices(words, k=20))}</p>\n")
+        start = time.perf_counter()
+        index = SearchIndex.open(directory)
+        print(f"incremental start: {(time.perf_counter() - start) * 1000:9.1f} ms   ({index.parsed} pages parsed)")
+
+        # Queries drawn from the same distribution as the text, so common terms
+        # with long posting lists are exercised as often as they would be in use
+        index.query_cache_size = 0
+        for terms in (1, 2, 3):
+            queries = [" ".join(rng.choices(words, weights, k=terms)) for _ in range(args.queries)]
+            samples = []
+            for query in queries:
+                t0 = time.perf_counter_ns()
+                index.search(query)
+                samples.append(time.perf_counter_ns() - t0)
+            print(f"query ({terms} term{'s' if terms > 1 else ' '}):    {summary(samples)}")
+
+        # What people type repeats: a Zipf-popular pool of distinct queries
+        index.query_cache_size = 256
+        pool = [" ".join(rng.choices(words, weights, k=rng.randint(1, 3))) for _ in range(1000)]
+        stream = rng.choices(pool, [1 / (rank + 1) for rank in range(len(pool))], k=args.queries)
+        hits, misses = index.query_hits, index.query_misses
+        samples = []
+        for query in stream:
+            t0 = time.perf_counter_ns()
+            index.search(query)
+            samples.append(time.perf_counter_ns() - t0)
+        hits, misses = index.query_hits - hits, index.query_misses - misses
+        print(f"query (cached):    {summary(samples)}   ({hits} hits, {misses} misses)")
+
+        start = time.perf_counter()
+        completer = Completer()
+        completer.add_pages((doc.title, doc.path) for doc in index.documents())
+        completer.set_terms((term, index.document_frequency(term)) for term in index.vocabulary())
+        print(f"completer load:    {(time.perf_counter() - start) * 1000:9.1f} ms   "
+              f"({len(completer.pages)} titles/paths, {len(completer.terms)} words)")
+        # Prefixes as they are typed: each keystroke extends the previous one
+        typed = [word[:length] for word in rng.choices(words, weights, k=args.queries // 4) for length in range(1, 5)]
+        cold, warm = [], []
+        for prefix in typed:
+            t0 = time.perf_counter_ns()
+            completer.suggest(prefix)
+            cold.append(time.perf_counter_ns() - t0)
+        for prefix in typed:
+            t0 = time.perf_counter_ns()
+            completer.suggest(prefix)
+            warm.append(time.perf_counter_ns() - t0)
+        print(f"suggest (first):   {summary(cold)}")
+        print(f"suggest (repeat):  {summary(warm)}")
+
+        pages = [{'title': doc.title, 'path': doc.path} for doc in index.documents()]
+        samples = []
+        for query in rng.choices(words, weights, k=min(args.queries, 500)):
+            t0 = time.perf_counter_ns()
+            linear_search(pages, query)
+            samples.append(time.perf_counter_ns() - t0)
+        print(f"linear substring:  {summary(samples)}   (old search, titles and paths only)")
+
+
+if __name__ == '__main__':
+    main()
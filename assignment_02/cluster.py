@@ -0,0 +1,110 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+from typing import List
+
+from aiohttp import web
+
+import server
+
+
+async def _serve_worker(host: str, port: int, app_options: dict, ready):
+    app = await server.init_app(shared=True, **app_options)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port, reuse_port=True)
+    await site.start()
+    ready.set()
+
+    stopping = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopping.set)
+    await stopping.wait()
+    # Stop accepting, let in-flight requests finish, then flush queued registrations
+    await runner.cleanup()
+
+
+def run_worker(index: int, host: str, port: int, app_options: dict, ready):
+    # Ctrl+C reaches the whole process group; only the supervisor acts on it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    print(f"Worker {index} started (pid {os.getpid()})")
+    asyncio.run(_serve_worker(host, port, app_options, ready))
+
+
+class WebCluster:
+    # The supervisor from assignment_01's ChatCluster (spawned SO_REUSEPORT
+    # workers, restarted when they exit) with what HTTP needs on top: workers
+    # report when they are accepting, and SIGHUP is a graceful reload. A fresh
+    # set of workers (with freshly imported code) is started alongside the old
+    # one, which is only asked to stop once every new worker is accepting.
+    def __init__(self, workers: int = 2, host: str = 'localhost', port: int = 8085,
+                 ready_timeout: float = 10.0, **app_options):
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.ready_timeout = ready_timeout
+        self.app_options = app_options
+        self.context = multiprocessing.get_context('spawn')
+        self.processes: List[multiprocessing.Process] = []
+        self._reload = asyncio.Event()
+
+    def _spawn(self, index: int):
+        ready = self.context.Event()
+        process = self.context.Process(
+            target=run_worker, args=(index, self.host, self.port, self.app_options, ready),
+            name=f"http-worker-{index}", daemon=True)
+        process.start()
+        return process, ready
+
+    async def _stop(self, processes: List[multiprocessing.Process]):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()  # SIGTERM: graceful shutdown in the worker
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(None, process.join, 70) for process in processes))
+
+    async def _start_generation(self) -> List[multiprocessing.Process]:
+        started = [self._spawn(index) for index in range(self.workers)]
+        loop = asyncio.get_running_loop()
+        ok = await asyncio.gather(*(loop.run_in_executor(None, ready.wait, self.ready_timeout)
+                                    for _, ready in started))
+        processes = [process for process, _ in started]
+        if not all(ok):
+            await self._stop(processes)
+            raise RuntimeError(f"Workers did not start listening within {self.ready_timeout}s")
+        return processes
+
+    async def reload(self):
+        try:
+            new = await self._start_generation()
+        except RuntimeError as e:
+            print(f"Reload failed, keeping the current workers: {e}")
+            return
+        old, self.processes = self.processes, new
+        await self._stop(old)
+        print(f"Reloaded {self.workers} workers")
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGHUP, self._reload.set)
+        self.processes = await self._start_generation()
+        print(f"Supervisor running {self.workers} workers on {self.host} : {self.port} "
+              f"(pid {os.getpid()}, SIGHUP to reload)")
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._reload.wait(), 1)
+                except asyncio.TimeoutError:
+                    pass
+                if self._reload.is_set():
+                    self._reload.clear()
+                    await self.reload()
+                for index, process in enumerate(self.processes):
+                    if not process.is_alive():
+                        print(f"Worker {index} exited with code {process.exitcode}, restarting")
+                        self.processes[index], _ = self._spawn(index)
+        except asyncio.CancelledError:
+            print("\nStopping workers...")
+        finally:
+            loop.remove_signal_handler(signal.SIGHUP)
+            await self._stop(self.processes)
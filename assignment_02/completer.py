@@ -0,0 +1,208 @@
+import heapq
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Sorts after every character a key can contain, so [prefix, prefix + END) is a prefix range
+END = '\U0010ffff'
+# Cached top-k lists kept per index before the cache is dropped wholesale
+PREFIX_CACHE_SIZE = 4096
+# Pages always rank above single-word completions
+PAGE_WEIGHT = 1 << 30
+# Matches ranked directly for the cost of visiting one weight level (two bisects)
+LEVEL_COST = 20
+
+
+class PrefixIndex:
+    # Case-insensitive prefix lookup over weighted strings, kept as two sorted
+    # lists rather than a trie: keys in order, and keys by (weight descending,
+    # key). Matches for a prefix are a contiguous slice of the first; when that
+    # slice is long (a one- or two-letter prefix) the best k come from walking
+    # the second a weight level at a time instead of ranking the whole slice.
+    # Results are cached per prefix and a change only evicts the prefixes of
+    # the key it touched, so repeated keystrokes cost a dict hit.
+    def __init__(self):
+        self.keys: List[str] = []
+        self.by_weight: List[str] = []
+        self.weights: Dict[str, int] = {}
+        self.display: Dict[str, str] = {}
+        self._top: Dict[str, Dict[int, List[str]]] = {}  # prefix -> k -> result
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, text: str) -> bool:
+        return text.casefold() in self.weights
+
+    def _rank(self, key: str) -> Tuple[int, str]:
+        return -self.weights[key], key
+
+    def _evict(self, key: str):
+        if self._top:
+            for end in range(len(key) + 1):
+                self._top.pop(key[:end], None)
+
+    def add(self, text: str, weight: int = 1):
+        key = text.casefold()
+        if not key:
+            return
+        if key in self.weights:
+            del self.by_weight[bisect_left(self.by_weight, self._rank(key), key=self._rank)]
+            self.weights[key] += weight
+        else:
+            insort(self.keys, key)
+            self.weights[key] = weight
+            self.display[key] = text
+        insort(self.by_weight, key, key=self._rank)
+        self._evict(key)
+
+    def update(self, items: Iterable[Tuple[str, int]]):
+        # Bulk add: everything is sorted into place once rather than with an insort each
+        new_keys = []
+        for text, weight in items:
+            key = text.casefold()
+            if not key:
+                continue
+            if key in self.weights:
+                self.weights[key] += weight
+            else:
+                self.weights[key] = weight
+                self.display[key] = text
+                new_keys.append(key)
+        self.keys.extend(new_keys)
+        self.keys.sort()
+        self.by_weight.extend(new_keys)
+        self.by_weight.sort(key=self._rank)
+        self._top.clear()
+
+    def set_weights(self, items: Iterable[Tuple[str, int]]):
+        # Bulk assign: each key takes the given weight (added if new, dropped at 0).
+        # A handful of changes are moved one by one, anything bigger re-sorted once.
+        changed = []
+        for text, weight in items:
+            key = text.casefold()
+            if key and self.weights.get(key, 0) != weight:
+                changed.append((key, text, weight))
+        if not changed:
+            return
+        if len(changed) * LEVEL_COST < len(self.by_weight):
+            for key, text, weight in changed:
+                if key in self.weights:
+                    self.discard(key, self.weights[key])
+                if weight > 0:
+                    self.add(text, weight)
+            return
+        new_keys = []
+        for key, text, weight in changed:
+            if weight <= 0:
+                if self.weights.pop(key, None) is not None:
+                    del self.display[key]
+            else:
+                if key not in self.weights:
+                    self.display[key] = text
+                    new_keys.append(key)
+                self.weights[key] = weight
+        if len(self.weights) != len(self.keys) + len(new_keys):
+            self.keys = [key for key in self.keys if key in self.weights]
+        self.keys.extend(new_keys)
+        self.keys.sort()
+        self.by_weight = sorted(self.keys, key=self._rank)
+        self._top.clear()
+
+    def discard(self, text: str, weight: int = 1):
+        key = text.casefold()
+        if key not in self.weights:
+            return
+        del self.by_weight[bisect_left(self.by_weight, self._rank(key), key=self._rank)]
+        if self.weights[key] > weight:
+            self.weights[key] -= weight
+            insort(self.by_weight, key, key=self._rank)
+        else:
+            del self.weights[key], self.display[key]
+            del self.keys[bisect_left(self.keys, key)]
+        self._evict(key)
+
+    def _heaviest(self, prefix: str, k: int, budget: int) -> Optional[List[str]]:
+        # Walk the weight levels heaviest first. Within one weight the by-weight
+        # list is in key order, so that level's matches are a run found by
+        # bisect. Gives up (None) after `budget` levels.
+        by_weight, rank = self.by_weight, self._rank
+        best: List[str] = []
+        pos, n = 0, len(by_weight)
+        while pos < n and len(best) < k:
+            if not budget:
+                return None
+            budget -= 1
+            weight = -self.weights[by_weight[pos]]
+            end = bisect_left(by_weight, (weight, END), pos, n, key=rank)
+            i = bisect_left(by_weight, (weight, prefix), pos, end, key=rank)
+            while i < end and len(best) < k and by_weight[i].startswith(prefix):
+                best.append(by_weight[i])
+                i += 1
+            pos = end
+        return best
+
+    def top(self, prefix: str, k: int) -> List[str]:
+        # Display forms of the k heaviest keys starting with prefix, heaviest first
+        prefix = prefix.casefold()
+        by_k = self._top.get(prefix)
+        if by_k is not None and k in by_k:
+            return list(by_k[k])
+        keys = self.keys
+        lo = bisect_left(keys, prefix)
+        matches = bisect_left(keys, prefix + END, lo) - lo
+        best = None
+        if matches > LEVEL_COST * k:
+            # One level costs about as much as ranking LEVEL_COST matches directly
+            best = self._heaviest(prefix, k, matches // LEVEL_COST)
+        if best is None:
+            best = heapq.nsmallest(k, keys[lo:lo + matches], key=self._rank)
+        result = [self.display[key] for key in best]
+        if by_k is None:
+            if len(self._top) >= PREFIX_CACHE_SIZE:
+                self._top.clear()
+            by_k = self._top[prefix] = {}
+        by_k[k] = result
+        return list(result)
+
+
+class Completer:
+    # URL-bar suggestions: whole page titles and paths matching what has been
+    # typed, then completions of the last word from the indexed vocabulary,
+    # weighted by how many pages contain them.
+    def __init__(self):
+        self.pages = PrefixIndex()
+        self.terms = PrefixIndex()
+
+    def add_pages(self, pages: Iterable[Tuple[str, str]]):
+        # Bulk load of (title, path) pairs
+        self.pages.update((text, PAGE_WEIGHT) for page in pages for text in page)
+
+    def set_terms(self, terms: Iterable[Tuple[str, int]]):
+        # (term, document frequency) pairs, current as of now; a frequency of 0 drops the term
+        self.terms.set_weights(terms)
+
+    def add_page(self, title: str, path: str):
+        # A single page indexed while running; its words come through set_terms
+        self.pages.add(title, PAGE_WEIGHT)
+        self.pages.add(path, PAGE_WEIGHT)
+
+    def remove_page(self, title: str, path: str):
+        # Words only on this page stay suggestable; searching them simply finds nothing
+        self.pages.discard(title, PAGE_WEIGHT)
+        self.pages.discard(path, PAGE_WEIGHT)
+
+    def suggest(self, text: str, k: int = 8) -> List[str]:
+        typed = text.lstrip()
+        if not typed:
+            return []
+        suggestions = self.pages.top(typed, k)
+        head, _, word = typed.rpartition(' ')
+        if word and len(suggestions) < k:
+            prefix = f"{head} " if head else ''
+            for term in self.terms.top(word, k):
+                candidate = prefix + term
+                if candidate not in suggestions:
+                    suggestions.append(candidate)
+                    if len(suggestions) == k:
+                        break
+        return suggestions
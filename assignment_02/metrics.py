@@ -0,0 +1,152 @@
+import os
+import time
+import weakref
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+# Upper bounds (le) of the histogram buckets; +Inf is implicit
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+class Histogram:
+    # Cumulative-on-export histogram with fixed buckets. Everything runs on the
+    # event loop thread, so observe() is a bisect and two integer adds with no
+    # lock and no allocation.
+    __slots__ = ('bounds', 'counts', 'total', 'count')
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def expose(self, name: str, labels: str, lines: List[str]):
+        prefix = f"{name}_bucket{{{labels}{',' if labels else ''}le="
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            lines.append(f'{prefix}"{bound:g}"}} {cumulative}')
+        lines.append(f'{prefix}"+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.total!r}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+
+
+class RouteStats:
+    __slots__ = ('labels', 'latency', 'sizes', 'statuses')
+
+    def __init__(self, method: str, route: str):
+        self.labels = f'method="{method}",route="{escape(route)}"'
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.sizes = Histogram(SIZE_BUCKETS)
+        self.statuses: Dict[int, int] = {}
+
+
+def escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    # Per-route request metrics for one server process. Stats are keyed by the
+    # matched route object (its path template, e.g. /assets/{path}), so label
+    # cardinality is bounded by the route table and the per-request lookup is
+    # an identity hash. Unmatched requests share one bucket.
+    def __init__(self):
+        self.routes: Dict[object, RouteStats] = {}
+        self.unmatched = RouteStats('*', 'unmatched')
+        self.in_flight = 0
+        self.registration_writes = Histogram(LATENCY_BUCKETS)
+        # Streamed responses whose size is only known when they are prepared;
+        # weak so a response that is never sent does not linger here
+        self._pending_sizes: 'weakref.WeakKeyDictionary[web.StreamResponse, RouteStats]' = weakref.WeakKeyDictionary()
+        self.started = time.time()
+
+    def stats_for(self, request: web.Request) -> RouteStats:
+        match_info = request.match_info
+        if match_info.http_exception is not None:
+            return self.unmatched
+        route = match_info.route
+        stats = self.routes.get(route)
+        if stats is None:
+            stats = self.routes[route] = RouteStats(route.method, route.resource.canonical)
+        return stats
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler):
+        # Latency covers the handler, not sending the body
+        stats = self.stats_for(request)
+        self.in_flight += 1
+        start = time.perf_counter()
+        response = None
+        try:
+            response = await handler(request)
+            return response
+        except web.HTTPException as e:
+            response = e
+            raise
+        finally:
+            stats.latency.observe(time.perf_counter() - start)
+            status = response.status if response is not None else 500
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            self.in_flight -= 1
+            if isinstance(response, web.Response) and isinstance(response.body, bytes):
+                stats.sizes.observe(len(response.body))
+            elif response is not None:
+                # e.g. FileResponse, which only knows its length once prepared
+                self._pending_sizes[response] = stats
+
+    async def on_response_prepare(self, request: web.Request, response: web.StreamResponse):
+        if self._pending_sizes:
+            stats = self._pending_sizes.pop(response, None)
+            if stats is not None and response.content_length is not None:
+                stats.sizes.observe(response.content_length)
+
+    def expose(self, extra: Optional[List[Tuple[str, str, float]]] = None) -> str:
+        # Prometheus text exposition format, version 0.0.4
+        lines = []
+        routes = [self.unmatched, *self.routes.values()]
+
+        lines.append("# HELP http_request_duration_seconds Time spent in the request handler.")
+        lines.append("# TYPE http_request_duration_seconds histogram")
+        for stats in routes:
+            if stats.latency.count:
+                stats.latency.expose('http_request_duration_seconds', stats.labels, lines)
+
+        lines.append("# HELP http_response_size_bytes Response body size.")
+        lines.append("# TYPE http_response_size_bytes histogram")
+        for stats in routes:
+            if stats.sizes.count:
+                stats.sizes.expose('http_response_size_bytes', stats.labels, lines)
+
+        lines.append("# HELP http_responses_total Responses by status code.")
+        lines.append("# TYPE http_responses_total counter")
+        for stats in routes:
+            for status, count in sorted(stats.statuses.items()):
+                lines.append(f'http_responses_total{{{stats.labels},status="{status}"}} {count}')
+
+        lines.append("# HELP http_requests_in_flight Requests currently being handled.")
+        lines.append("# TYPE http_requests_in_flight gauge")
+        lines.append(f"http_requests_in_flight {self.in_flight}")
+
+        lines.append("# HELP registration_write_duration_seconds Time from queueing a registration to it being written.")
+        lines.append("# TYPE registration_write_duration_seconds histogram")
+        self.registration_writes.expose('registration_write_duration_seconds', '', lines)
+
+        for name, kind, value in extra or ():
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {value:g}")
+
+        # With several workers each scrape sees one of them; this tells them apart
+        lines.append("# TYPE process_start_time_seconds gauge")
+        lines.append(f"process_start_time_seconds {self.started:.3f}")
+        lines.append("# TYPE process_id gauge")
+        lines.append(f"process_id {os.getpid()}")
+        return "\n".join(lines) + "\n"
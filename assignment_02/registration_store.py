@@ -0,0 +1,159 @@
+import asyncio
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from registration_writer import RegistrationWriter
+
+# db.txt stays the source of truth: one "username  email" line per registration
+SEPARATOR = '  '
+
+Registration = Tuple[str, str]  # (username, email)
+
+
+class DuplicateRegistration(Exception):
+    def __init__(self, field: str, value: str):
+        super().__init__(f"{field} {value!r} is already registered")
+        self.field = field
+        self.value = value
+
+
+def parse_line(line: str) -> Optional[Registration]:
+    # Emails never contain spaces, so the last double space separates the fields
+    username, sep, email = line.rstrip('\r\n').rpartition(SEPARATOR)
+    if not sep or not username.strip() or not email:
+        return None
+    return username.strip(), email.strip()
+
+
+class RegistrationStore:
+    # Registrations indexed by username and by email, both case-insensitive, so
+    # lookups and duplicate checks are dict hits instead of a scan of db.txt.
+    # The indexes are rebuilt from the log in the executor after startup; until
+    # that finishes, requests that need them wait rather than the server
+    # delaying its start.
+    #
+    # A new registration is first reserved locally, so concurrent requests in
+    # this process cannot both claim a name, and then queued on the writer.
+    # Under the writer's lock the store reads any lines other processes have
+    # appended since `offset` and re-checks the batch against them, so with
+    # several workers sharing db.txt a name is still only ever written once.
+    def __init__(self, path: str, writer: RegistrationWriter):
+        self.path = path
+        self.writer = writer
+        writer.validate = self._validate_batch
+        writer.committed = self._commit_batch
+        self.by_username: Dict[str, Registration] = {}
+        self.by_email: Dict[str, Registration] = {}
+        self.reserved: Set[str] = set()  # casefolded names and emails waiting on the writer
+        self.offset = 0      # bytes of the log reflected in the indexes
+        self.skipped = 0     # malformed or duplicate lines found while loading
+        self._load_lock = threading.Lock()
+        self._loaded: Optional[asyncio.Future] = None
+
+    def __len__(self) -> int:
+        return len(self.by_username)
+
+    def _index(self, registration: Registration) -> bool:
+        username, email = registration
+        username_key = username.casefold()
+        email_key = email.casefold()
+        if username_key in self.by_username or email_key in self.by_email:
+            return False
+        # Most names are already lower case; reuse the string rather than keep a copy
+        self.by_username[username if username_key == username else username_key] = registration
+        self.by_email[email if email_key == email else email_key] = registration
+        return True
+
+    def _conflict(self, registration: Registration) -> Optional[DuplicateRegistration]:
+        username, email = registration
+        if username.casefold() in self.by_username:
+            return DuplicateRegistration('username', username)
+        if email.casefold() in self.by_email:
+            return DuplicateRegistration('email', email)
+        return None
+
+    def load_sync(self, chunk_size: int = 1 << 22) -> int:
+        # Index every complete line from self.offset onwards; returns how many were added.
+        # The log is read in chunks so a large file is never held in memory at once.
+        with self._load_lock:
+            added = 0
+            try:
+                f = open(self.path, 'rb')
+            except FileNotFoundError:
+                return 0
+            with f:
+                f.seek(self.offset)
+                tail = b''
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    data = tail + chunk
+                    # A trailing line without its newline is a write still in progress
+                    end = data.rfind(b'\n') + 1
+                    tail = data[end:]
+                    for line in data[:end].decode('utf-8', 'replace').splitlines():
+                        registration = parse_line(line)
+                        if registration is not None and self._index(registration):
+                            added += 1
+                        elif line.strip():
+                            self.skipped += 1
+                    self.offset += end
+            return added
+
+    def _validate_batch(self, registrations: List[Registration]) -> List[Optional[Exception]]:
+        # Writer hook, under its lock: catch up with the log, then reject anything now taken
+        if self.writer.shared:
+            self.load_sync()
+        return [self._conflict(registration) for registration in registrations]
+
+    def _commit_batch(self, registrations: List[Registration], size: int):
+        # Writer hook: our lines went in right after everything load_sync had read
+        with self._load_lock:
+            for registration in registrations:
+                self._index(registration)
+            self.offset += size
+
+    def start(self):
+        # Begin the rebuild in the background; callers await ready()
+        loop = asyncio.get_running_loop()
+        self._loaded = asyncio.ensure_future(loop.run_in_executor(None, self.load_sync))
+
+    async def ready(self):
+        if self._loaded is None:
+            self.start()
+        await self._loaded
+
+    async def lookup(self, username: Optional[str] = None, email: Optional[str] = None) -> Optional[Registration]:
+        await self.ready()
+        index, key = (self.by_username, username) if username is not None else (self.by_email, email)
+        if key is None:
+            return None
+        registration = index.get(key.casefold())
+        if registration is None and self.writer.shared:
+            # Another worker may have registered it since we last read the log
+            await asyncio.get_running_loop().run_in_executor(None, self.load_sync)
+            registration = index.get(key.casefold())
+        return registration
+
+    async def register(self, username: str, email: str):
+        # Raises DuplicateRegistration if either field is taken, OSError if the write fails
+        await self.ready()
+        registration = (username, email)
+        conflict = self._conflict(registration)
+        if conflict is not None:
+            raise conflict
+        keys = (username.casefold(), email.casefold())
+        if keys[0] in self.reserved:
+            raise DuplicateRegistration('username', username)
+        if keys[1] in self.reserved:
+            raise DuplicateRegistration('email', email)
+        self.reserved.update(keys)
+        try:
+            await self.writer.append(f"{username}{SEPARATOR}{email}\n", registration)
+        finally:
+            self.reserved.difference_update(keys)
+
+    async def close(self):
+        if self._loaded is not None:
+            await asyncio.gather(self._loaded, return_exceptions=True)
@@ -0,0 +1,144 @@
+import asyncio
+import fcntl
+import os
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
+
+# When a batch of registrations counts as written
+FSYNC_BATCH = 'batch'        # fsync every batch before acknowledging it
+FSYNC_INTERVAL = 'interval'  # at most one batch (and fsync) per interval; requests wait for it
+FSYNC_NEVER = 'never'        # acknowledge once the OS has the data, leave syncing to the kernel
+FSYNC_POLICIES = (FSYNC_BATCH, FSYNC_INTERVAL, FSYNC_NEVER)
+
+Entry = Tuple[bytes, asyncio.Future, object]  # line, waiter, caller's tag
+
+
+class RegistrationWriter:
+    # Group-commit writer for the registration file. Request handlers queue a
+    # line and wait; one background task takes everything queued so far, writes
+    # it through a single long-lived handle in the executor, applies the fsync
+    # policy and then releases all of the waiting requests together. The event
+    # loop never blocks on the file, and a burst of N registrations costs one
+    # write (and at most one fsync) per batch instead of N open/write/close.
+    #
+    # With shared=True several processes append to the same file: each batch is
+    # written with one O_APPEND write while holding an exclusive flock, and the
+    # optional `validate` hook runs under that lock first, so it can catch up
+    # on other processes' lines and veto entries before anything is written.
+    def __init__(self, path: str, fsync: str = FSYNC_BATCH, fsync_interval: float = 0.01,
+                 max_batch: int = 4096, shared: bool = False):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy {fsync!r}, expected one of {FSYNC_POLICIES}")
+        self.path = path
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.max_batch = max_batch
+        self.shared = shared
+        # Called in the executor with the batch's tags: validate (under the lock)
+        # returns an exception per entry to reject it, or None to write it;
+        # committed gets the tags that were written (once durable under the
+        # fsync policy) and the bytes they took
+        self.validate: Optional[Callable[[List[object]], Sequence[Optional[Exception]]]] = None
+        self.committed: Optional[Callable[[List[object], int], None]] = None
+        self.records = 0
+        self.batches = 0
+        self.fsyncs = 0
+        self._pending: List[Entry] = []
+        self._wakeup = asyncio.Event()
+        self._fd: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    async def start(self):
+        await asyncio.get_running_loop().run_in_executor(None, self._open)
+        self._task = asyncio.create_task(self._run())
+
+    async def append(self, line: str, tag: object = None):
+        # Returns once the line is durable under the fsync policy; raises OSError if
+        # the write failed, or whatever `validate` returned for this entry
+        if self._closing:
+            raise RuntimeError("Registration writer is closed")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((line.encode('utf-8'), future, tag))
+        self._wakeup.set()
+        await future
+
+    def _write_batch(self, batch: List[Entry]) -> Sequence[Optional[Exception]]:
+        fd = self._fd
+        if self.shared:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            tags = [tag for _, _, tag in batch]
+            errors = self.validate(tags) if self.validate is not None else [None] * len(batch)
+            data = b"".join(line for (line, _, _), error in zip(batch, errors) if error is None)
+            if data:
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(fd, view):]
+                try:
+                    if self.fsync != FSYNC_NEVER:
+                        os.fsync(fd)
+                        self.fsyncs += 1
+                except OSError:
+                    # The requests fail, so nothing is committed, but the bytes are in
+                    # the file and still count towards the store's offset
+                    if self.committed is not None:
+                        self.committed([], len(data))
+                    raise
+                if self.committed is not None:
+                    self.committed([tag for tag, error in zip(tags, errors) if error is None], len(data))
+        finally:
+            if self.shared:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        return errors
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        last_sync = 0.0
+        while True:
+            if not self._pending:
+                if self._closing:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if self.fsync == FSYNC_INTERVAL:
+                # Hold the batch open until the interval since the last fsync has passed
+                delay = last_sync + self.fsync_interval - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            try:
+                errors = await loop.run_in_executor(None, self._write_batch, batch)
+            except OSError as e:
+                errors = [e] * len(batch)
+            else:
+                self.batches += 1
+            finally:
+                last_sync = time.monotonic()
+
+            for (_, future, _), error in zip(batch, errors):
+                if error is None:
+                    self.records += 1
+                # A handler that went away may have cancelled its future; its line is written anyway
+                if future.done():
+                    continue
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+
+    async def close(self):
+        # Write out whatever is still queued, then close the file
+        self._closing = True
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -1,48 +1,334 @@
 import sys
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                            QHBoxLayout, QLineEdit, QPushButton, QTabWidget, QLabel)
+                            QHBoxLayout, QLineEdit, QPushButton, QTabWidget, QLabel, QCompleter)
 from PyQt5.QtWebEngineWidgets import QWebEngineView
-from PyQt5.QtCore import QUrl, Qt, pyqtSignal
+from PyQt5.QtCore import QUrl, Qt, pyqtSignal, QObject, QFileSystemWatcher, QTimer, QStringListModel
 from PyQt5.QtNetwork import QNetworkAccessManager, QNetworkRequest, QNetworkReply
+import multiprocessing
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from urllib.parse import urlparse, quote_plus
 
+from completer import Completer
+from search_index import SearchIndex, parse_pages
+
+# Editors and copies touch a page several times; refresh once they have settled
+REFRESH_DELAY_MS = 250
+# Suggestions follow the keyboard closely; prefetching waits for a longer pause
+SUGGEST_DELAY_MS = 40
+SUGGESTIONS = 8
+PREFETCH_DELAY_MS = 150
+PREFETCH_COUNT = 3
+# Local pages are served with no-cache, so a prefetched copy is only trusted
+# for a short while; edits on disk invalidate it immediately via the watcher
+PAGE_CACHE_TTL = 60.0
+PAGE_CACHE_ENTRIES = 64
+PAGE_CACHE_BYTES = 16 * 1024 * 1024
+# QWebEngineView.setHtml() refuses content over 2 MB
+SET_HTML_LIMIT = 2 * 1024 * 1024 - 1024
+# Pages or words loaded into the completer per event-loop turn at startup
+COMPLETER_CHUNK = 2000
+# Below this many pages to parse, starting worker processes costs more than it saves
+PARALLEL_MIN_PAGES = 64
+
+class CachedPage:
+    __slots__ = ('body', 'etag', 'fetched')
+    
+    def __init__(self, body, etag, fetched):
+        self.body = body
+        self.etag = etag
+        self.fetched = fetched
+
+class PageCache:
+    # LRU of prefetched local pages keyed by URL, bounded by count and bytes
+    def __init__(self, max_entries=PAGE_CACHE_ENTRIES, max_bytes=PAGE_CACHE_BYTES, ttl=PAGE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+    
+    def peek(self, url):
+        #Entry whether or not it is still fresh (for revalidation), without touching the LRU order
+        return self.entries.get(url)
+    
+    def get(self, url):
+        #Fresh entry or None
+        entry = self.entries.get(url)
+        if entry is None or time.monotonic() - entry.fetched > self.ttl:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(url)
+        self.hits += 1
+        return entry
+    
+    def put(self, url, body, etag):
+        self.invalidate(url)
+        if len(body) > self.max_bytes:
+            return
+        self.entries[url] = CachedPage(body, etag, time.monotonic())
+        self.size += len(body)
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted.body)
+    
+    def revalidated(self, url):
+        #The server answered 304: the copy we have is good for another ttl
+        entry = self.entries.get(url)
+        if entry is not None:
+            entry.fetched = time.monotonic()
+            self.entries.move_to_end(url)
+    
+    def invalidate(self, url):
+        entry = self.entries.pop(url, None)
+        if entry is not None:
+            self.size -= len(entry.body)
+    
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+    
+    def invalidate_prefix(self, prefix):
+        for url in [url for url in self.entries if url == prefix or url.startswith(prefix + '/')]:
+            self.invalidate(url)
+
+class PageDiscovery(QObject):
+    # Startup indexing off the GUI thread: loads the saved index, walks the
+    # templates directory and parses new or changed pages, in a process pool
+    # when there are enough of them. The index is only ever modified on the GUI
+    # thread; this thread hands it over once loaded and then streams parsed
+    # batches back through queued signals as they complete.
+    loaded = pyqtSignal(object, object)   # saved index, pages deleted since it was written
+    parsed = pyqtSignal(object)           # batch of parsed pages
+    progress = pyqtSignal(int, int)       # pages parsed so far, pages to parse
+    finished = pyqtSignal(object)         # every directory and page seen, to watch
+    
+    def __init__(self, templates_dir):
+        super().__init__()
+        self.templates_dir = templates_dir
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="page-discovery", daemon=True)
+    
+    def start(self):
+        self._thread.start()
+    
+    def cancel(self):
+        self._cancelled.set()
+    
+    def _run(self):
+        index = SearchIndex(self.templates_dir)
+        index.load()
+        # Worked out before the index is handed over; after that it belongs to the GUI thread
+        gone, stale, paths = index.changes()
+        self.loaded.emit(index, gone)
+        self.progress.emit(0, len(stale))
+        executor = None
+        if len(stale) >= PARALLEL_MIN_PAGES:
+            # spawn rather than fork: a forked child would inherit Qt's threads mid-flight
+            executor = ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn'))
+        try:
+            done = 0
+            for batch in parse_pages(stale, executor):
+                if self._cancelled.is_set():
+                    break
+                done += len(batch)
+                self.parsed.emit(batch)
+                self.progress.emit(done, len(stale))
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        if not self._cancelled.is_set():
+            self.finished.emit(paths)
+
 class CustomSearchEngine:
+    # One per application, shared by every tab. Pages are discovered in the
+    # background at startup (see PageDiscovery) and results fill in as they
+    # arrive; after that a QFileSystemWatcher reports changed directories and
+    # pages and only those are re-indexed, so a query never touches the disk.
     def __init__(self, local_server_url="http://localhost:8085", templates_dir="templates"):
         self.local_server_url = local_server_url.rstrip('/')
         self.templates_dir = templates_dir
-        self.local_pages = self._discover_local_pages()
+        self.completer = Completer()
+        # Empty until the saved index has been loaded in the background
+        self.local_pages = SearchIndex(templates_dir)
+        self.discovery = self._discover_local_pages()
         self.network_manager = QNetworkAccessManager()
+        self.page_cache = PageCache()
+        self._prefetching = set()
+        
+        self._changed_paths = set()
+        self._refresh_timer = QTimer()
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.setInterval(REFRESH_DELAY_MS)
+        self._refresh_timer.timeout.connect(self._apply_changes)
+        self.watcher = QFileSystemWatcher()
+        self.watcher.directoryChanged.connect(self._path_changed)
+        self.watcher.fileChanged.connect(self._path_changed)
+        self._completer_timer = QTimer()
+        self._completer_timer.timeout.connect(self._feed_completer)
+        # Words on pages indexed since the completer last re-weighted them
+        self._touched_terms = set()
     
     def _discover_local_pages(self):
-        #Scan templates directory to find available local pages
-        pages = []
-        if os.path.exists(self.templates_dir):
-            for root, dirs, files in os.walk(self.templates_dir):
-                for file in files:
-                    if file.endswith('.html'):
-                        rel_path = os.path.relpath(os.path.join(root, file), self.templates_dir)
-                        url = f"{self.local_server_url}/{rel_path.replace(os.sep, '/')}"
-                        pages.append({
-                            'url': url,
-                            'title': os.path.splitext(file)[0].replace('_', ' ').title(),
-                            'path': rel_path
-                        })
-        return pages
-    
-    def search(self, query):
+        #Index the templates directory in the background; call start() once connected to its signals
+        discovery = PageDiscovery(self.templates_dir)
+        discovery.loaded.connect(self._index_loaded)
+        discovery.parsed.connect(self._pages_parsed)
+        discovery.finished.connect(self._discovery_finished)
+        return discovery
+    
+    def start(self):
+        self.discovery.start()
+    
+    def _index_loaded(self, index, gone):
+        index.indexed = self._page_indexed
+        index.removed = self._page_removed
+        self.local_pages = index
+        # Pages and words reach the completer a chunk per event-loop turn rather
+        # than in one pass; pages indexed from here on come through the hooks
+        self._pending_pages = iter(index.documents())
+        self._pending_terms = iter(sorted(index.vocabulary()))
+        self._completer_timer.start(0)
+        for path in gone:
+            index.remove(path)
+    
+    def _pages_parsed(self, batch):
+        self.local_pages.add_parsed(batch)
+        for relative, _, _, _ in batch:
+            self.page_cache.invalidate(f"{self.local_server_url}/{relative}")
+        self._reweight_terms()
+    
+    def _discovery_finished(self, paths):
+        watched = set(self.watcher.directories()) | set(self.watcher.files())
+        missing = [p for p in paths if p not in watched]
+        if missing:
+            self.watcher.addPaths(missing)
+    
+    def _feed_completer(self):
+        pages = list(islice(self._pending_pages, COMPLETER_CHUNK))
+        if pages:
+            by_path, docs = self.local_pages.by_path, self.local_pages.docs
+            # Skip pages replaced or removed since startup; the hooks already handled them
+            self.completer.add_pages((doc.title, doc.path) for doc in pages
+                                     if doc.path in by_path and docs[by_path[doc.path]] is doc)
+            return
+        terms = list(islice(self._pending_terms, COMPLETER_CHUNK))
+        if terms:
+            frequency = self.local_pages.document_frequency
+            self.completer.set_terms((term, frequency(term)) for term in terms)
+            return
+        self._completer_timer.stop()
+    
+    def _page_indexed(self, doc, terms):
+        self.completer.add_page(doc.title, doc.path)
+        self._touched_terms.update(terms)
+    
+    def _reweight_terms(self):
+        #Bring the words of just-indexed pages up to their document frequency, once per indexing pass
+        if self._touched_terms:
+            frequency = self.local_pages.document_frequency
+            self.completer.set_terms((term, frequency(term)) for term in self._touched_terms)
+            self._touched_terms.clear()
+    
+    def _page_removed(self, doc):
+        self.completer.remove_page(doc.title, doc.path)
+    
+    def _watch(self, path):
+        #Watch directories (pages added, removed, renamed) and pages (edited in place) at or under path
+        if not os.path.isdir(path):
+            if path.endswith('.html') and os.path.isfile(path):
+                self.watcher.addPath(path)
+            return
+        paths = []
+        for root, dirs, files in os.walk(path):
+            paths.append(root)
+            paths.extend(os.path.join(root, name) for name in files if name.endswith('.html'))
+        watched = set(self.watcher.directories()) | set(self.watcher.files())
+        missing = [p for p in paths if p not in watched]
+        if missing:
+            self.watcher.addPaths(missing)
+    
+    def _path_changed(self, path):
+        #Collect changes and restart the debounce timer
+        self._changed_paths.add(path)
+        self._refresh_timer.start()
+    
+    def _apply_changes(self):
+        #Re-index just the changed pages and directories, and watch anything new in them
+        paths, self._changed_paths = self._changed_paths, set()
+        for path in sorted(paths):
+            # A change inside a directory that is being rescanned anyway is covered by it
+            if any(path != other and path.startswith(other + os.sep) for other in paths):
+                continue
+            self.local_pages.refresh(path)
+            self._watch(path)
+            # Drop prefetched copies of anything under the changed path
+            relative = os.path.relpath(path, self.templates_dir).replace(os.sep, '/')
+            if relative == '.':
+                self.page_cache.clear()
+            else:
+                self.page_cache.invalidate_prefix(f"{self.local_server_url}/{relative}")
+        self._reweight_terms()
+    
+    def prefetch(self, query):
+        #Fetch the top local results for query in the background, revalidating stale copies
+        for result in self.search(query)[:PREFETCH_COUNT]:
+            url = result['url']
+            if result['priority'] < 1 or url in self._prefetching:
+                continue
+            entry = self.page_cache.peek(url)
+            if entry is not None and time.monotonic() - entry.fetched <= self.page_cache.ttl:
+                continue
+            request = QNetworkRequest(QUrl(url))
+            if entry is not None and entry.etag:
+                request.setRawHeader(b'If-None-Match', entry.etag.encode('latin-1'))
+            self._prefetching.add(url)
+            reply = self.network_manager.get(request)
+            reply.finished.connect(lambda reply=reply, url=url: self._prefetched(url, reply))
+    
+    def _prefetched(self, url, reply):
+        self._prefetching.discard(url)
+        status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+        if reply.error() == QNetworkReply.NoError and status == 200:
+            etag = bytes(reply.rawHeader(b'ETag')).decode('latin-1')
+            self.page_cache.put(url, bytes(reply.readAll()), etag)
+        elif status == 304:
+            self.page_cache.revalidated(url)
+        else:
+            self.page_cache.invalidate(url)
+        reply.deleteLater()
+    
+    def cached_page(self, url):
+        #Prefetched body for url if it is still fresh, else None
+        entry = self.page_cache.get(url)
+        return entry.body if entry is not None else None
+    
+    def close(self):
+        #Persist changes picked up while running, so the next start does not re-parse them
+        self.discovery.cancel()
+        self._refresh_timer.stop()
+        if self.local_pages.dirty:
+            self.local_pages.save()
+    
+    def search(self, query, limit=10):
         #Custom search that prioritizes local pages with fallback to Google
         results = []
         
-        # First add local pages that match the query
-        for page in self.local_pages:
-            if query.lower() in page['title'].lower() or query.lower() in page['path'].lower():
-                results.append({
-                    'title': f"Local Page: {page['title']}",
-                    'url': page['url'],
-                    'description': f"Local template page at {page['path']}",
-                    'priority': 1  # Highest priority
-                })
+        # First add local pages ranked by BM25 over their text
+        for page, score in self.local_pages.search(query, limit):
+            results.append({
+                'title': f"Local Page: {page.title}",
+                'url': f"{self.local_server_url}/{page.path}",
+                'description': page.snippet or f"Local template page at {page.path}",
+                'priority': 1,  # Highest priority
+                'score': score
+            })
         
         # Always add Google search as an option
         google_url = f"https://www.google.com/search?q={quote_plus(query)}"
@@ -53,7 +339,7 @@ class CustomSearchEngine:
             'priority': 0
         })
         
-        # Sort by priority (highest first)
+        # Sort by priority (highest first); the sort is stable, so local pages keep their rank order
         results.sort(key=lambda x: x['priority'], reverse=True)
         
         return results
@@ -61,8 +347,9 @@ class CustomSearchEngine:
 class BrowserTab(QWidget):
     loadFinished = pyqtSignal(bool)
     
-    def __init__(self, parent=None):
+    def __init__(self, search_engine, parent=None):
         super().__init__(parent)
+        self.search_engine = search_engine
         self.browser = QWebEngineView()
         self.browser.setUrl(QUrl("about:blank"))
         
@@ -99,6 +386,23 @@ class BrowserTab(QWidget):
         self.go_btn.clicked.connect(self._navigate_to_url)
         self.url_bar.returnPressed.connect(self._navigate_to_url)
         
+        # Suggest completions and prefetch likely results while the user is still typing
+        self.suggestions = QStringListModel(self)
+        self.url_completer = QCompleter(self.suggestions, self)
+        # The model already holds just the ranked matches; show them as they are
+        self.url_completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.url_bar.setCompleter(self.url_completer)
+        self._suggest_timer = QTimer(self)
+        self._suggest_timer.setSingleShot(True)
+        self._suggest_timer.setInterval(SUGGEST_DELAY_MS)
+        self._suggest_timer.timeout.connect(self._suggest)
+        self._prefetch_timer = QTimer(self)
+        self._prefetch_timer.setSingleShot(True)
+        self._prefetch_timer.setInterval(PREFETCH_DELAY_MS)
+        self._prefetch_timer.timeout.connect(self._prefetch)
+        self.url_bar.textEdited.connect(lambda text: self._suggest_timer.start())
+        self.url_bar.textEdited.connect(lambda text: self._prefetch_timer.start())
+        
         # Update URL bar when page changes
         self.browser.urlChanged.connect(self._update_url_bar)
         self.browser.loadFinished.connect(self._handle_load_finished)
@@ -112,6 +416,8 @@ class BrowserTab(QWidget):
         #Handle navigation to URL or search query
         url = self.url_bar.text().strip()
         self.status_label.setVisible(False)
+        self._suggest_timer.stop()
+        self.url_completer.popup().hide()
         
         # If empty, load blank page
         if not url:
@@ -125,14 +431,34 @@ class BrowserTab(QWidget):
             # Treat as search query
             self._handle_search_query(url)
     
+    def _suggest(self):
+        text = self.url_bar.text()
+        if not text.strip() or text.startswith(('http://', 'https://', 'file://')):
+            self.suggestions.setStringList([])
+            return
+        self.suggestions.setStringList(self.search_engine.completer.suggest(text, SUGGESTIONS))
+        if self.suggestions.rowCount():
+            self.url_completer.complete()
+    
+    def _prefetch(self):
+        query = self.url_bar.text().strip()
+        if query and not query.startswith(('http://', 'https://', 'file://')):
+            self.search_engine.prefetch(query)
+    
     def _handle_search_query(self, query):
-        #Process search query using our custom search engine
-        search_engine = CustomSearchEngine()
-        results = search_engine.search(query)
+        #Process search query using the application's search engine
+        self._prefetch_timer.stop()
+        results = self.search_engine.search(query)
         
         if results:
-            # Navigate to the top result
-            self.browser.setUrl(QUrl(results[0]['url']))
+            # Navigate to the top result, straight from the prefetch cache when we have it
+            url = results[0]['url']
+            body = self.search_engine.cached_page(url) if results[0]['priority'] >= 1 else None
+            if body is not None and len(body) <= SET_HTML_LIMIT:
+                # The base URL keeps relative links and assets pointing at the server
+                self.browser.setHtml(body.decode('utf-8', 'replace'), QUrl(url))
+            else:
+                self.browser.setUrl(QUrl(url))
         else:
             # Fallback to blank page
             self.browser.setUrl(QUrl("about:blank"))
@@ -162,6 +488,11 @@ class BrowserWindow(QMainWindow):
         self.setWindowTitle("NET322 SEARCH ENGINE")
         self.setGeometry(100, 100, 1024, 768)
         
+        # Shared by every tab; local results fill in while it indexes in the background
+        self.search_engine = CustomSearchEngine()
+        self.search_engine.discovery.progress.connect(self._indexing_progress)
+        self.search_engine.start()
+        
         # Tab widget
         self.tabs = QTabWidget()
         self.tabs.setTabsClosable(True)
@@ -178,7 +509,7 @@ class BrowserWindow(QMainWindow):
     
     def _add_new_tab(self, title):
         #Add a new browser tab
-        tab = BrowserTab()
+        tab = BrowserTab(self.search_engine)
         i = self.tabs.addTab(tab, title)
         self.tabs.setCurrentIndex(i)
         
@@ -186,6 +517,16 @@ class BrowserWindow(QMainWindow):
         tab.browser.setUrl(QUrl("about:blank"))
         return tab
     
+    def _indexing_progress(self, done, total):
+        if done < total:
+            self.statusBar().showMessage(f"Indexing local pages: {done}/{total}")
+        else:
+            self.statusBar().clearMessage()
+    
+    def closeEvent(self, event):
+        self.search_engine.close()
+        super().closeEvent(event)
+    
     def _close_tab(self, index):
         #Close a tab
         if self.tabs.count() > 1:
@@ -0,0 +1,551 @@
+import heapq
+import marshal
+import math
+import os
+import re
+import sys
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Executor, as_completed
+from html.parser import HTMLParser
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+# Bump when the on-disk layout changes; an index with another version is rebuilt
+INDEX_VERSION = 1
+TOKEN = re.compile(r"[^\W_]+")
+SNIPPET_LENGTH = 160
+# Pages per task when parsing in a worker pool, to amortise the round trip
+PARSE_BATCH = 32
+# Distinct (query terms, limit) results remembered between index changes
+QUERY_CACHE_SIZE = 256
+
+# (display title, snippet, length in tokens, count per term)
+Analysis = Tuple[str, str, int, Dict[str, int]]
+# (relative path, full path, mtime_ns, size)
+PageStat = Tuple[str, str, int, int]
+# (relative path, mtime_ns, size, analysis or None if the page could not be read)
+Parsed = Tuple[str, int, int, Optional[Analysis]]
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN.findall(text.casefold())
+
+
+class TextExtractor(HTMLParser):
+    # Visible text and <title> of an HTML page; script and style bodies are dropped
+    SKIP = {'script', 'style', 'noscript', 'template'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title_parts: List[str] = []
+        self.text_parts: List[str] = []
+        self._skip = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skip += 1
+        elif tag == 'title':
+            self._in_title = True
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self._skip:
+            self._skip -= 1
+        elif tag == 'title':
+            self._in_title = False
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        if self._in_title:
+            self.title_parts.append(data)
+        else:
+            self.text_parts.append(data)
+
+
+def extract_text(html: str) -> Tuple[str, str]:
+    # Returns (title, body text) with whitespace collapsed
+    parser = TextExtractor()
+    parser.feed(html)
+    parser.close()
+    title = " ".join(" ".join(parser.title_parts).split())
+    text = " ".join(" ".join(parser.text_parts).split())
+    return title, text
+
+
+def analyze(path: str, html: str) -> Analysis:
+    title, text = extract_text(html)
+    # The file name is part of what a page is "about" (register.html -> register)
+    name_words = os.path.splitext(path)[0].replace('/', ' ').replace('_', ' ')
+    tokens = tokenize(f"{title} {name_words} {text}")
+    counts: Dict[str, int] = {}
+    for token in tokens:
+        counts[token] = counts.get(token, 0) + 1
+    display_title = title or os.path.splitext(os.path.basename(path))[0].replace('_', ' ').title()
+    return display_title, text[:SNIPPET_LENGTH], len(tokens), counts
+
+
+def analyze_files(pages: List[PageStat]) -> List[Parsed]:
+    # Read and analyse a batch of pages; module level so it can run in a worker process
+    parsed = []
+    for relative, full, mtime_ns, size in pages:
+        try:
+            with open(full, encoding='utf-8', errors='replace') as f:
+                html = f.read()
+        except OSError:
+            parsed.append((relative, mtime_ns, size, None))
+            continue
+        parsed.append((relative, mtime_ns, size, analyze(relative, html)))
+    return parsed
+
+
+def parse_pages(pages: List[PageStat], executor: Optional[Executor] = None) -> Iterator[List[Parsed]]:
+    # Batches of parsed pages, in completion order when an executor spreads them over workers
+    batches = [pages[i:i + PARSE_BATCH] for i in range(0, len(pages), PARSE_BATCH)]
+    if executor is None:
+        for batch in batches:
+            yield analyze_files(batch)
+        return
+    futures = [executor.submit(analyze_files, batch) for batch in batches]
+    try:
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # The consumer stopped early (or failed): don't leave the rest queued
+        for future in futures:
+            future.cancel()
+
+
+class Document:
+    __slots__ = ('path', 'title', 'snippet', 'length', 'mtime_ns', 'size')
+
+    def __init__(self, path: str, title: str, snippet: str, length: int, mtime_ns: int, size: int):
+        self.path = path            # relative to the indexed directory, '/' separated
+        self.title = title
+        self.snippet = snippet
+        self.length = length        # tokens, for BM25 length normalisation
+        self.mtime_ns = mtime_ns
+        self.size = size
+
+    def to_row(self) -> tuple:
+        return self.path, self.title, self.snippet, self.length, self.mtime_ns, self.size
+
+
+class SearchIndex:
+    # BM25-ranked inverted index over the .html files under a directory.
+    #
+    # Postings live in two parts. The base segment is what was last saved: for
+    # every term a span of three flat arrays (document ids, term frequencies and
+    # the BM25 weight of the term in that document), sorted by weight, highest
+    # first. It is loaded with a handful of frombytes() calls, so opening the
+    # index costs a stat() per page rather than parsing them. Pages indexed
+    # since go into small per-term lists, and removed pages are only marked
+    # None in `docs`; save() merges both into a fresh base segment.
+    #
+    # Weights depend on corpus-wide statistics, so once anything changed they
+    # are recomputed per term on first use and cached until the next change.
+    def __init__(self, directory: str, index_path: Optional[str] = None, k1: float = 1.2, b: float = 0.75):
+        self.directory = directory
+        self.index_path = index_path or os.path.join(directory, '.search_index')
+        self.k1 = k1
+        self.b = b
+        self.docs: List[Optional[Document]] = []       # None marks a removed page
+        self.by_path: Dict[str, int] = {}
+        self.total_length = 0
+        self.parsed = 0      # pages parsed by the last refresh()
+        self.version = 0     # bumped on every change to the indexed pages or their weights
+        self.query_cache_size = QUERY_CACHE_SIZE
+        self.query_hits = 0
+        self.query_misses = 0
+        # (terms, limit) for BM25 results, (query text, limit) for the title/path fallback
+        self._queries: 'OrderedDict[Tuple[object, int], List[Tuple[Document, float]]]' = OrderedDict()
+        self._queries_version = 0
+        self._spans: Dict[str, Tuple[int, int]] = {}
+        self._ids = array('I')
+        self._tfs = array('I')
+        self._weights = array('f')
+        self._added: Dict[str, Tuple[List[int], List[int]]] = {}
+        self._stale = False  # base weights no longer match the corpus
+        self._norms: Optional[List[float]] = None
+        # term -> [ids by weight, weights, weight by id (built on first multi-term query)]
+        self._impacts: Dict[str, list] = {}
+        # Called after a page is indexed (with its distinct terms) and after one is removed
+        self.indexed: Optional[Callable[[Document, List[str]], None]] = None
+        self.removed: Optional[Callable[[Document], None]] = None
+
+    def __len__(self) -> int:
+        return len(self.by_path)
+
+    @classmethod
+    def open(cls, directory: str, index_path: Optional[str] = None,
+             executor: Optional[Executor] = None) -> 'SearchIndex':
+        # Load the saved index if there is one, bring it up to date and save any changes
+        index = cls(directory, index_path)
+        index.load()
+        if index.refresh(executor=executor):
+            index.save()
+        return index
+
+    @property
+    def dirty(self) -> bool:
+        # Changed since it was loaded or last saved
+        return self._stale
+
+    def vocabulary(self) -> Set[str]:
+        return self._spans.keys() | self._added.keys()
+
+    def document_frequency(self, term: str) -> int:
+        # Pages containing the term; removed pages still count until the next save()
+        span = self._spans.get(term)
+        added = self._added.get(term)
+        return (span[1] - span[0] if span else 0) + (len(added[0]) if added else 0)
+
+    def documents(self) -> List[Document]:
+        return [doc for doc in self.docs if doc is not None]
+
+    # --- building -------------------------------------------------------------
+
+    def _relative(self, path: str) -> str:
+        relative = os.path.relpath(path, self.directory).replace(os.sep, '/')
+        return '' if relative == '.' else relative
+
+    def _scan(self, path: str) -> Tuple[Dict[str, Tuple[str, int, int]], List[str]]:
+        # relative path -> (full path, mtime_ns, size) for every page at or under
+        # `path`, plus the directories walked. os.scandir rather than os.walk:
+        # the entry types come with the directory listing, so only pages are stat()ed.
+        found = {}
+        directories = []
+        if os.path.isfile(path):
+            pages = [path] if path.endswith('.html') else []
+        else:
+            pages = []
+            pending = [path] if os.path.isdir(path) else []
+            while pending:
+                directory = pending.pop()
+                directories.append(directory)
+                try:
+                    with os.scandir(directory) as entries:
+                        for entry in entries:
+                            if entry.is_dir(follow_symlinks=False):  # as os.walk
+                                pending.append(entry.path)
+                            elif entry.name.endswith('.html') and entry.is_file():
+                                pages.append(entry.path)
+                except OSError:
+                    continue  # removed or unreadable
+        for full in pages:
+            try:
+                st = os.stat(full)
+            except OSError:
+                continue  # removed while we were looking
+            found[self._relative(full)] = (full, st.st_mtime_ns, st.st_size)
+        return found, directories
+
+    def changes(self, path: Optional[str] = None) -> Tuple[List[str], List[PageStat], List[str]]:
+        # What refresh() would do, without doing it: pages gone from disk, pages
+        # new or modified since they were indexed, and every directory and page
+        # seen (for a file watcher). Limited to `path` (a page or a directory
+        # inside the indexed one) when given.
+        on_disk, directories = self._scan(path or self.directory)
+        prefix = self._relative(path) if path else ''
+        gone = [known for known in self.by_path
+                if known not in on_disk and (not prefix or known == prefix or known.startswith(prefix + '/'))]
+        stale = []
+        for relative, (full, mtime_ns, size) in on_disk.items():
+            doc_id = self.by_path.get(relative)
+            if doc_id is not None:
+                doc = self.docs[doc_id]
+                if doc.mtime_ns == mtime_ns and doc.size == size:
+                    continue
+            stale.append((relative, full, mtime_ns, size))
+        return gone, stale, directories + [full for full, _, _ in on_disk.values()]
+
+    def refresh(self, path: Optional[str] = None, executor: Optional[Executor] = None) -> bool:
+        # Re-index added and modified pages and drop deleted ones, everywhere or
+        # only at/under `path`; pages are parsed on `executor` if one is given.
+        # Returns True if anything changed.
+        gone, stale, _ = self.changes(path)
+        for relative in gone:
+            self.remove(relative)
+        self.parsed = 0
+        for batch in parse_pages(stale, executor):
+            self.parsed += self.add_parsed(batch)
+        return bool(gone) or self.parsed > 0
+
+    def add_parsed(self, batch: List[Parsed]) -> int:
+        # Index a batch from parse_pages(); returns how many pages it added
+        added = 0
+        for relative, mtime_ns, size, analysis in batch:
+            if analysis is not None:
+                self.add_analysis(relative, analysis, mtime_ns, size)
+                added += 1
+        return added
+
+    def _invalidate(self):
+        # Anything derived from the current pages and statistics is now out of date
+        self.version += 1
+        self._norms = None
+        self._impacts.clear()
+
+    def _changed(self):
+        self._stale = True
+        self._invalidate()
+
+    def add(self, path: str, html: str, mtime_ns: int = 0, size: int = 0):
+        self.add_analysis(path, analyze(path, html), mtime_ns, size)
+
+    def add_analysis(self, path: str, analysis: Analysis, mtime_ns: int = 0, size: int = 0):
+        if path in self.by_path:
+            self.remove(path)
+        title, snippet, length, counts = analysis
+        doc_id = len(self.docs)
+        self.docs.append(Document(path, title, snippet, length, mtime_ns, size))
+        self.by_path[path] = doc_id
+        self.total_length += length
+        for term, count in counts.items():
+            added = self._added.get(term)
+            if added is None:
+                added = self._added[term] = ([], [])
+            added[0].append(doc_id)
+            added[1].append(count)
+        self._changed()
+        if self.indexed is not None:
+            self.indexed(self.docs[doc_id], list(counts))
+
+    def remove(self, path: str):
+        # Only marks the page removed: its postings are skipped from now on and
+        # dropped by the next save()
+        doc_id = self.by_path.pop(path, None)
+        if doc_id is None:
+            return
+        doc = self.docs[doc_id]
+        self.total_length -= doc.length
+        self.docs[doc_id] = None
+        self._changed()
+        if self.removed is not None:
+            self.removed(doc)
+
+    def _postings(self, term: str) -> Tuple[List[int], List[int]]:
+        # Document ids and term frequencies of every live page containing the term
+        docs = self.docs
+        ids: List[int] = []
+        tfs: List[int] = []
+        span = self._spans.get(term)
+        if span is not None:
+            start, end = span
+            ids = self._ids[start:end].tolist()
+            tfs = self._tfs[start:end].tolist()
+        added = self._added.get(term)
+        if added is not None:
+            ids.extend(added[0])
+            tfs.extend(added[1])
+        if len(self.docs) != len(self.by_path):
+            live = [i for i, doc_id in enumerate(ids) if docs[doc_id] is not None]
+            ids = [ids[i] for i in live]
+            tfs = [tfs[i] for i in live]
+        return ids, tfs
+
+    def _length_norms(self) -> List[float]:
+        # k1 * (1 - b + b * |d| / avgdl) per document id, shared by every term
+        if self._norms is None:
+            n = len(self.by_path)
+            k1, b = self.k1, self.b
+            scale = k1 * b * n / self.total_length if self.total_length else 0.0
+            self._norms = [k1 * (1 - b) + scale * doc.length if doc is not None else 0.0 for doc in self.docs]
+        return self._norms
+
+    def _bm25(self, ids: List[int], tfs: List[int], norms: List[float]) -> Tuple[List[int], List[int], List[float]]:
+        # The term's weight in each page; all three lists ordered by weight, highest first
+        n = len(self.by_path)
+        idf = math.log(1 + (n - len(ids) + 0.5) / (len(ids) + 0.5))
+        scale = idf * (self.k1 + 1)
+        weights = [scale * tf / (tf + norms[doc_id]) for doc_id, tf in zip(ids, tfs)]
+        order = sorted(range(len(ids)), key=weights.__getitem__, reverse=True)
+        return [ids[i] for i in order], [tfs[i] for i in order], [weights[i] for i in order]
+
+    # --- persistence ----------------------------------------------------------
+
+    def _merge(self):
+        # Fold added pages into the base segment, drop removed ones and renumber
+        norms = self._length_norms()
+        remap = None
+        docs = self.docs
+        if len(docs) != len(self.by_path):
+            remap = {}
+            docs = []
+            for old_id, doc in enumerate(self.docs):
+                if doc is not None:
+                    remap[old_id] = len(docs)
+                    docs.append(doc)
+
+        spans: Dict[str, Tuple[int, int]] = {}
+        ids, tfs, weights = array('I'), array('I'), array('f')
+        for term in sorted(self.vocabulary()):
+            term_ids, term_tfs = self._postings(term)
+            if not term_ids:
+                continue
+            term_ids, term_tfs, term_weights = self._bm25(term_ids, term_tfs, norms)
+            if remap is not None:
+                term_ids = [remap[doc_id] for doc_id in term_ids]
+            spans[term] = (len(ids), len(ids) + len(term_ids))
+            ids.fromlist(term_ids)
+            tfs.fromlist(term_tfs)
+            weights.fromlist(term_weights)
+        self.docs = docs
+        self.by_path = {doc.path: doc_id for doc_id, doc in enumerate(docs)}
+        self._spans, self._ids, self._tfs, self._weights = spans, ids, tfs, weights
+        self._added.clear()
+        self._stale = False
+        self._invalidate()
+
+    def save(self):
+        if self._stale:
+            self._merge()
+        # Native-endian arrays: this is a per-machine cache, not an exchange format
+        terms = list(self._spans)
+        offsets = array('I', (start for start, _ in self._spans.values()))
+        offsets.append(len(self._ids))
+        data = (INDEX_VERSION, sys.byteorder, [doc.to_row() for doc in self.docs], terms,
+                offsets.tobytes(), self._ids.tobytes(), self._tfs.tobytes(), self._weights.tobytes())
+        tmp_path = self.index_path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                marshal.dump(data, f)
+            # Atomic swap, so a reader never sees a half-written index
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"Could not save search index to {self.index_path}: {e}")
+
+    def load(self) -> bool:
+        try:
+            with open(self.index_path, 'rb') as f:
+                data = marshal.load(f)
+            version, byteorder, rows, terms, offsets_bytes, ids_bytes, tfs_bytes, weights_bytes = data
+        except (OSError, EOFError, ValueError, TypeError):
+            return False
+        if version != INDEX_VERSION or byteorder != sys.byteorder:
+            return False
+        offsets, ids, tfs, weights = array('I'), array('I'), array('I'), array('f')
+        offsets.frombytes(offsets_bytes)
+        ids.frombytes(ids_bytes)
+        tfs.frombytes(tfs_bytes)
+        weights.frombytes(weights_bytes)
+        self.docs = [Document(*row) for row in rows]
+        self.by_path = {doc.path: doc_id for doc_id, doc in enumerate(self.docs)}
+        self.total_length = sum(doc.length for doc in self.docs)
+        self._spans = {term: (offsets[i], offsets[i + 1]) for i, term in enumerate(terms)}
+        self._ids, self._tfs, self._weights = ids, tfs, weights
+        self._added.clear()
+        self._stale = False
+        self._invalidate()
+        return True
+
+    # --- querying -------------------------------------------------------------
+
+    def _term_impacts(self, term: str) -> Optional[list]:
+        impacts = self._impacts.get(term)
+        if impacts is None:
+            if not self._stale:
+                span = self._spans.get(term)
+                if span is None:
+                    return None
+                start, end = span
+                impacts = [self._ids[start:end], self._weights[start:end], None]
+            else:
+                ids, tfs = self._postings(term)
+                if not ids:
+                    return None
+                ordered, _, weights = self._bm25(ids, tfs, self._length_norms())
+                impacts = [ordered, weights, None]
+            self._impacts[term] = impacts
+        return impacts
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[Document, float]]:
+        # Best `limit` pages for the query by BM25 score, highest first. Results
+        # are kept in an LRU keyed on the query's distinct terms, so case, word
+        # order and repeats do not matter, and the whole cache is dropped as
+        # soon as the index version moves on. When no page contains the terms
+        # (a word still being typed, say), pages whose title or path contains
+        # the query text are returned instead, with a score of 0.
+        if limit <= 0:
+            return []
+        terms = tuple(sorted(set(tokenize(query))))
+        if self._queries_version != self.version:
+            self._queries.clear()
+            self._queries_version = self.version
+        results = self._cached((terms, limit), lambda: self._search(terms, limit))
+        if not results:
+            text = query.strip().casefold()
+            if text:
+                results = self._cached((text, limit), lambda: self._match_names(text, limit))
+        return list(results)
+
+    def _cached(self, key: Tuple[object, int],
+                compute: Callable[[], List[Tuple[Document, float]]]) -> List[Tuple[Document, float]]:
+        results = self._queries.get(key)
+        if results is not None:
+            self._queries.move_to_end(key)
+            self.query_hits += 1
+            return results
+        self.query_misses += 1
+        results = compute()
+        self._queries[key] = results
+        if len(self._queries) > self.query_cache_size:
+            self._queries.popitem(last=False)
+        return results
+
+    def _match_names(self, text: str, limit: int) -> List[Tuple[Document, float]]:
+        # Substring match on title and path, pages starting with the text first
+        matches = []
+        for doc in self.docs:
+            if doc is None:
+                continue
+            title, path = doc.title.casefold(), doc.path.casefold()
+            if text in title or text in path:
+                matches.append((not (title.startswith(text) or path.startswith(text)), doc.path, doc))
+        return [(doc, 0.0) for _, _, doc in heapq.nsmallest(limit, matches)]
+
+    def _search(self, terms: Tuple[str, ...], limit: int) -> List[Tuple[Document, float]]:
+        # Fagin's threshold algorithm over the weight-ordered lists: walk the
+        # query terms' lists in step, fully score each page the first time it
+        # is seen, and stop once the k-th best score reaches the sum of the
+        # weights at the current depth, which bounds any page not yet seen.
+        # Common terms have long but flat lists, so this usually stops after a
+        # few dozen entries instead of touching every page that contains them.
+        lists = [impacts for impacts in map(self._term_impacts, terms) if impacts is not None]
+        if not lists:
+            return []
+        if len(lists) == 1:
+            ordered, weights, _ = lists[0]
+            return [(self.docs[doc_id], weight) for doc_id, weight in zip(ordered[:limit], weights)]
+
+        for impacts in lists:
+            if impacts[2] is None:
+                impacts[2] = dict(zip(impacts[0], impacts[1]))
+        maps = [by_doc for _, _, by_doc in lists]
+        best: List[Tuple[float, int]] = []  # min-heap of (score, doc id)
+        seen = set()
+        depth = 0
+        while True:
+            threshold = 0.0
+            exhausted = True
+            for ordered, weights, _ in lists:
+                if depth >= len(ordered):
+                    continue
+                exhausted = False
+                threshold += weights[depth]
+                doc_id = ordered[depth]
+                if doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                score = 0.0
+                for by_doc in maps:
+                    score += by_doc.get(doc_id, 0.0)
+                if len(best) < limit:
+                    heapq.heappush(best, (score, doc_id))
+                elif score > best[0][0]:
+                    heapq.heapreplace(best, (score, doc_id))
+            if exhausted or (len(best) == limit and best[0][0] >= threshold):
+                break
+            depth += 1
+        best.sort(reverse=True)
+        return [(self.docs[doc_id], score) for score, doc_id in best]
@@ -1,22 +1,51 @@
 import asyncio
 from aiohttp import web
 import os
+import time
 from pathlib import Path
 
+from metrics import Metrics
+from registration_store import DuplicateRegistration, RegistrationStore
+from registration_writer import FSYNC_BATCH, FSYNC_POLICIES, RegistrationWriter
+from template_cache import TemplateCache
+
 #Set up paths for all required files 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+ASSETS_DIR = os.path.realpath(os.path.join(BASE_DIR, 'assets'))
+# Assets are replaced under a new name rather than edited in place, so browsers may keep them
+ASSET_CACHE_CONTROL = 'public, max-age=31536000'
 DB_FILE = os.path.join(BASE_DIR, 'db.txt')
 
-async def serve_html(filename, status=200):
-    #serve HTML files from templates folder
-    filepath = os.path.join(TEMPLATES_DIR, filename)
-    if not os.path.exists(filepath):
+TEMPLATES = web.AppKey('templates', TemplateCache)
+REGISTRATIONS = web.AppKey('registrations', RegistrationStore)
+METRICS = web.AppKey('metrics', Metrics)
+
+def serve_html(request, filename, status=200):
+    #serve HTML files from the in-memory template cache, no disk I/O per request
+    template = request.app[TEMPLATES].get(filename)
+    if template is None:
         return web.Response(status=404, text="404: File Not Found")
-    
-    with open(filepath, 'r', encoding='utf-8') as f:
-        content = f.read()
-    return web.Response(text=content, content_type='text/html', status=status)
+
+    # Precompressed variant matching Accept-Encoding, or a 304 if the client's copy is current
+    variant = template.select(request.headers.get('Accept-Encoding', ''))
+    if status == 200 and template.not_modified(variant, request.if_none_match, request.if_modified_since):
+        return web.Response(status=304, headers=variant.not_modified_headers)
+
+    return web.Response(body=variant.body, headers=variant.headers, status=status)
+
+async def serve_asset(request):
+    #stream files from the assets folder; FileResponse uses sendfile and handles Range/ETag
+    relpath = request.match_info['path']
+    if any(part.startswith('.') for part in relpath.replace('\\', '/').split('/')):
+        return web.Response(status=404, text="404: File Not Found")
+
+    # Resolve symlinks and '..' before checking the file is really inside ASSETS_DIR
+    filepath = os.path.realpath(os.path.join(ASSETS_DIR, relpath))
+    if os.path.commonpath([filepath, ASSETS_DIR]) != ASSETS_DIR or not os.path.isfile(filepath):
+        return web.Response(status=404, text="404: File Not Found")
+
+    return web.FileResponse(filepath, headers={'Cache-Control': ASSET_CACHE_CONTROL})
 
 async def handle_registration(request):
     
@@ -28,63 +57,147 @@ async def handle_registration(request):
         return web.Response(
             text="Error: Both username and email are required", status=400)
 
-    # Ensure directory exists
-    os.makedirs(os.path.dirname(DB_FILE), exist_ok=True)
-    
-    # Write to database file
+    # Each registration is one "username  email" line in the database file
+    if any(c in username for c in '\r\n') or any(c.isspace() for c in email):
+        return web.Response(
+            text="Error: Invalid username or email", status=400)
+
+    # Rejected straight from the in-memory index if either field is taken;
+    # otherwise this returns once the line's batch is on disk
+    start = time.perf_counter()
     try:
-        with open(DB_FILE, 'a', encoding='utf-8') as db:
-            db.write(f"{username}  {email}\n")
-        
+        await request.app[REGISTRATIONS].register(username, email)
+        if METRICS in request.app:
+            request.app[METRICS].registration_writes.observe(time.perf_counter() - start)
+
         # Return success response
         return web.Response(text="Registration successful!", content_type='text/html' '<a href="/">Return Home</a>')
         
+    except DuplicateRegistration as e:
+        return web.Response(text=f"Error: {e}", status=409)
+
     except IOError as e:
         return web.Response(
             text=f"Error saving data: {str(e)}",
             status=500
         )
 
-async def handle_request(request):
-    #Main request handler
-    if request.method == 'GET':
-        if request.path == '/':
-            return await serve_html('index.html')
-        elif request.path == '/index.html':
-            return await serve_html('index.html')
-        elif request.path == '/register.html':
-            return await serve_html('register.html')
-        else:
-            return web.Response(status=404, text="404: Not Found")
-    
-    elif request.method == 'POST' and (request.path == '/register.html' or request.path == '/submit.html'):
-        return await handle_registration(request)
-    
-    else:
-        return web.Response(status=405, text="405: Method Not Allowed")
+async def handle_lookup(request):
+    #Look a registration up by ?username= or ?email=
+    username = request.query.get('username')
+    email = request.query.get('email')
+    if username is None and email is None:
+        return web.Response(
+            text="Error: Provide a username or email to look up", status=400)
+
+    registration = await request.app[REGISTRATIONS].lookup(username=username, email=email)
+    if registration is None:
+        return web.json_response({'error': "Not registered"}, status=404)
+    return web.json_response({'username': registration[0], 'email': registration[1]})
+
+def page(filename):
+    #handler for one page of the template cache, bound to its file name up front
+    async def handler(request):
+        return serve_html(request, filename)
+    return handler
+
+async def handle_metrics(request):
+    #Prometheus text exposition of this process's request metrics
+    writer = request.app[REGISTRATIONS].writer
+    text = request.app[METRICS].expose([
+        ('registration_records_total', 'counter', writer.records),
+        ('registration_batches_total', 'counter', writer.batches),
+        ('registration_fsyncs_total', 'counter', writer.fsyncs),
+        ('template_cache_entries', 'gauge', len(request.app[TEMPLATES])),
+    ])
+    return web.Response(body=text.encode(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+# Every route the server answers. aiohttp's router is the only dispatch step:
+# each entry goes straight to its handler, with pages prebound to their template.
+ROUTES = [
+    ('GET', '/', page('index.html')),
+    ('GET', '/index.html', page('index.html')),
+    ('GET', '/register.html', page('register.html')),
+    ('GET', '/explore.html', page('explore.html')),
+    ('GET', '/assets/{path:.+}', serve_asset),
+    ('GET', '/registrations', handle_lookup),
+    ('GET', '/metrics', handle_metrics),  # only with init_app(metrics=True)
+    ('POST', '/register.html', handle_registration),
+    ('POST', '/submit.html', handle_registration),
+]
 
-async def init_app():
+async def start_background(app):
+    await app[TEMPLATES].start()
+    await app[REGISTRATIONS].writer.start()
+    # Rebuilds the username/email indexes from the database file in the background
+    app[REGISTRATIONS].start()
+
+async def stop_background(app):
+    await app[TEMPLATES].stop()
+    # Flushes registrations that are still queued
+    await app[REGISTRATIONS].writer.close()
+    await app[REGISTRATIONS].close()
+
+async def init_app(fsync=FSYNC_BATCH, fsync_interval=0.01, shared=False, db_file=None, metrics=True):
     # Ensure templates directory exists
     os.makedirs(TEMPLATES_DIR, exist_ok=True)
 
-    #Initializing the application
+    #Initializing the application, timing every request unless metrics are off
     app = web.Application()
-    app.router.add_get('/', handle_request)
-    app.router.add_get('/index.html', handle_request)
-    app.router.add_get('/register.html', handle_request)
-    #app.router.add_post('/register', handle_request)
-    app.router.add_post('/submit.html', handle_request)
+    if metrics:
+        app[METRICS] = Metrics()
+        app.middlewares.append(app[METRICS].middleware)
+        app.on_response_prepare.append(app[METRICS].on_response_prepare)
+    # Templates are preloaded and kept current by a background mtime check
+    app[TEMPLATES] = TemplateCache(TEMPLATES_DIR)
+    # All writes to the database file go through one group-commit writer;
+    # shared=True when other worker processes append to the same file
+    db_file = db_file or DB_FILE
+    writer = RegistrationWriter(db_file, fsync=fsync, fsync_interval=fsync_interval, shared=shared)
+    app[REGISTRATIONS] = RegistrationStore(db_file, writer)
+    app.on_startup.append(start_background)
+    app.on_cleanup.append(stop_background)
+    for method, path, handler in ROUTES:
+        if handler is handle_metrics and not metrics:
+            continue
+        if method == 'GET':
+            # add_get also answers HEAD, which add_route('GET', ...) does not
+            app.router.add_get(path, handler)
+        else:
+            app.router.add_route(method, path, handler)
     return app
 
 def main():
-    
+    import argparse
+
+    parser = argparse.ArgumentParser(description="NET322 HTTP server")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8085)
+    parser.add_argument('--fsync', choices=FSYNC_POLICIES, default=FSYNC_BATCH,
+                        help="when registrations are fsynced before being acknowledged")
+    parser.add_argument('--fsync-interval', type=float, default=10.0,
+                        help="milliseconds between fsyncs with --fsync=interval")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="worker processes sharing the port with SO_REUSEPORT")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        from cluster import WebCluster
+        cluster = WebCluster(args.workers, args.host, args.port,
+                             fsync=args.fsync, fsync_interval=args.fsync_interval / 1000)
+        try:
+            asyncio.run(cluster.run())
+        except KeyboardInterrupt:
+            print("\nServer stopped gracefully")
+        return
+
     try:
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-        app = loop.run_until_complete(init_app())
+        app = loop.run_until_complete(init_app(args.fsync, args.fsync_interval / 1000))
 
         print("------ Server is up and Running -------") 
-        web.run_app(app, host='localhost', port=8085)
+        web.run_app(app, host=args.host, port=args.port)
     except KeyboardInterrupt:
         print("\nServer stopped gracefully")
     except Exception as e:
@@ -0,0 +1,198 @@
+import asyncio
+import gzip
+import hashlib
+import os
+from datetime import datetime, timezone
+from email.utils import formatdate
+from typing import Dict, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; without it only gzip variants are built
+    brotli = None
+
+# Content codings we precompress, in order of preference
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=11)
+    # mtime=0 keeps the output, and so its ETag, stable across reloads
+    return gzip.compress(body, compresslevel=9, mtime=0)
+
+
+def choose_encoding(accept_encoding: str, available: Tuple[str, ...]) -> str:
+    # Pick the first coding in `available` (preference order) that the client
+    # accepts, or 'identity'
+    accepted = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    wildcard = accepted.get('*', 0.0)
+    for encoding in available:
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return 'identity'
+
+
+class Variant:
+    # One encoded representation of a template, with the headers to send it
+    # and the smaller set that goes with a 304
+    __slots__ = ('body', 'etag', 'headers', 'not_modified_headers')
+
+    def __init__(self, body: bytes, etag: str, headers: Dict[str, str]):
+        self.body = body
+        self.etag = etag
+        self.headers = headers
+        self.not_modified_headers = {name: value for name, value in headers.items()
+                                     if name in ('ETag', 'Last-Modified', 'Cache-Control', 'Vary')}
+
+
+class CachedTemplate:
+    # One template held in memory, ready to send. Every representation gets a
+    # strong ETag derived from the content (plus the coding, so the gzip and
+    # brotli bodies are distinguishable) and the file's Last-Modified date.
+    __slots__ = ('name', 'body', 'mtime_ns', 'size', 'last_modified', 'variants', 'encodings')
+
+    def __init__(self, name: str, body: bytes, mtime_ns: int, size: int):
+        self.name = name
+        self.body = body
+        self.mtime_ns = mtime_ns
+        self.size = size
+        # HTTP dates have one-second resolution
+        self.last_modified = datetime.fromtimestamp(mtime_ns // 1_000_000_000, timezone.utc)
+        digest = hashlib.blake2b(body, digest_size=12).hexdigest()
+        common = {
+            'Content-Type': 'text/html; charset=utf-8',
+            'Last-Modified': formatdate(mtime_ns // 1_000_000_000, usegmt=True),
+            # Cached copies may be reused, but only after a (cheap) conditional request
+            'Cache-Control': 'no-cache',
+            'Vary': 'Accept-Encoding',
+        }
+        self.variants: Dict[str, Variant] = {'identity': self._variant(body, digest, common)}
+        for encoding in ENCODINGS:
+            encoded = compress(body, encoding)
+            if len(encoded) < len(body):
+                self.variants[encoding] = self._variant(encoded, f"{digest}-{encoding}", common,
+                                                        {'Content-Encoding': encoding})
+        self.encodings = tuple(encoding for encoding in ENCODINGS if encoding in self.variants)
+
+    @staticmethod
+    def _variant(body: bytes, tag: str, common: Dict[str, str], extra: Optional[Dict[str, str]] = None) -> Variant:
+        etag = f'"{tag}"'
+        headers = dict(common)
+        headers['ETag'] = etag
+        headers['Content-Length'] = str(len(body))
+        if extra:
+            headers.update(extra)
+        return Variant(body, etag, headers)
+
+    def select(self, accept_encoding: str) -> Variant:
+        if not accept_encoding:
+            return self.variants['identity']
+        return self.variants[choose_encoding(accept_encoding, self.encodings)]
+
+    def not_modified(self, variant: Variant, if_none_match, if_modified_since: Optional[datetime]) -> bool:
+        # If-None-Match takes precedence; it uses the weak comparison, so a W/ prefix is ignored
+        if if_none_match is not None:
+            return any(tag.value == '*' or f'"{tag.value}"' == variant.etag for tag in if_none_match)
+        return if_modified_since is not None and self.last_modified <= if_modified_since
+
+
+class TemplateCache:
+    # In-memory copy of every .html file in a directory. Templates are read,
+    # UTF-8 encoded and compressed once, so serving one is a dict lookup. A
+    # watcher task stats the directory every `interval` seconds and reloads only
+    # the files whose mtime or size changed (off the event loop), so edits show
+    # up within one interval and requests never touch the disk.
+    def __init__(self, directory: str, interval: float = 1.0):
+        self.directory = directory
+        self.interval = interval
+        self.templates: Dict[str, CachedTemplate] = {}
+        self.reloads = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.templates)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.templates
+
+    def get(self, name: str) -> Optional[CachedTemplate]:
+        return self.templates.get(name)
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        # name -> (mtime_ns, size) for every template on disk
+        found = {}
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.html') and entry.is_file():
+                        st = entry.stat()
+                        found[entry.name] = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            pass
+        return found
+
+    def _load(self, name: str) -> Optional[CachedTemplate]:
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                raw = f.read()
+        except OSError:
+            return None
+        # Normalise to clean UTF-8 once, rather than on every request
+        body = raw.decode('utf-8', 'replace').encode('utf-8')
+        return CachedTemplate(name, body, st.st_mtime_ns, st.st_size)
+
+    def refresh(self) -> int:
+        # Synchronise the cache with the directory; returns how many templates changed
+        on_disk = self._scan()
+        templates = dict(self.templates)
+        changed = 0
+        for name in list(templates):
+            if name not in on_disk:
+                del templates[name]
+                changed += 1
+        for name, (mtime_ns, size) in on_disk.items():
+            current = templates.get(name)
+            if current is not None and current.mtime_ns == mtime_ns and current.size == size:
+                continue
+            template = self._load(name)
+            if template is not None:
+                templates[name] = template
+                changed += 1
+        if changed:
+            # Swap in the new dict whole; readers on the loop never see a partial update
+            self.templates = templates
+            self.reloads += changed
+        return changed
+
+    async def _watch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await loop.run_in_executor(None, self.refresh)
+            except OSError as e:
+                print(f"Template refresh failed: {e}")
+
+    async def start(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.refresh)
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
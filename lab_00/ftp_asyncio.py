@@ -1,80 +1,147 @@
 # FTP Server (AsyncIO)
+#
+# Protocol: every command is one line. Replies start with one status line;
+# LIST and GET follow it with "SIZE <n>" and exactly n bytes, and an upload
+# is "PUT <name> <n>", answered with READY, then exactly n bytes from the
+# client, then OK. With the size known up front neither side has to guess
+# where a file ends, so files of any size go through in fixed-size chunks.
 import asyncio
 import os
 from pathlib import Path
 
+# StreamReader buffer limit; also the largest chunk handled at once
+STREAM_LIMIT = 1 << 20
+# Uploads are written here first and renamed into place once complete
+UPLOAD_PREFIX = '.upload-'
+
 class AsyncFTPServer:
     def __init__(self, root_dir):
         self.root = Path(root_dir).absolute()
         os.makedirs(self.root, exist_ok=True)
+        self.root = Path(os.path.realpath(self.root))
+
+    def _resolve(self, name):
+        # Only plain names directly inside the root: no '..', no hidden or partial files
+        if '/' in name or '\\' in name or name.startswith('.'):
+            return None
+        path = Path(os.path.realpath(self.root / name))
+        if path.parent != self.root:
+            return None
+        return path
+
+    async def send_file(self, writer, file_path):
+        try:
+            f = open(file_path, 'rb')
+        except OSError:
+            return b"ERROR: File not found\n"
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            writer.write(f"SIZE {size}\n".encode())
+            await writer.drain()
+            # os.sendfile() where the transport allows it: the data goes from the
+            # page cache to the socket without passing through Python. It rejects
+            # a count of 0, and an empty file has nothing to send anyway.
+            if size:
+                await asyncio.get_running_loop().sendfile(writer.transport, f, 0, size)
+        return None
+
+    async def receive_file(self, reader, writer, file_path, size):
+        tmp_path = file_path.with_name(f"{UPLOAD_PREFIX}{os.getpid()}-{id(writer)}-{file_path.name}")
+        writer.write(b"READY\n")
+        await writer.drain()
+        try:
+            with open(tmp_path, 'wb') as f:
+                remaining = size
+                while remaining:
+                    chunk = await reader.read(min(STREAM_LIMIT, remaining))
+                    if not chunk:
+                        raise asyncio.IncompleteReadError(b'', remaining)
+                    # A chunk at most; this lands in the page cache and returns quickly
+                    f.write(chunk)
+                    remaining -= len(chunk)
+            # Readers of the old file never see a half-written one
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
 
     async def handle_client(self, reader, writer):
         addr = writer.get_extra_info('peername')
         print(f"Connection from {addr}")
-        
+
         try:
             while True:
-                command = await reader.read(100)
+                command = await reader.readline()
                 if not command:
                     break
-                    
-                command = command.decode().strip()
+
+                command = command.decode(errors='replace').strip()
                 parts = command.split()
                 if not parts:
                     continue
-                    
+
                 cmd = parts[0].upper()
-                
+
                 if cmd == 'LIST':
-                    files = [f.name for f in self.root.iterdir()]
-                    response = '\n'.join(files) if files else "Empty"
+                    files = [f.name for f in self.root.iterdir() if not f.name.startswith(UPLOAD_PREFIX)]
+                    listing = ('\n'.join(files) if files else "Empty").encode()
+                    writer.write(f"SIZE {len(listing)}\n".encode() + listing)
+                    await writer.drain()
+                    continue
                 elif cmd == 'GET':
                     if len(parts) < 2:
                         response = "ERROR: Missing filename"
                     else:
-                        file_path = self.root / parts[1]
-                        if file_path.exists():
-                            with open(file_path, 'rb') as f:
-                                content = f.read()
-                            writer.write(content)
-                            await writer.drain()
-                            continue
+                        file_path = self._resolve(parts[1])
+                        if file_path is not None and file_path.is_file():
+                            error = await self.send_file(writer, file_path)
+                            if error is None:
+                                continue
+                            response = error.decode().strip()
                         else:
                             response = "ERROR: File not found"
                 elif cmd == 'PUT':
-                    if len(parts) < 2:
-                        response = "ERROR: Missing filename"
+                    if len(parts) < 3 or not parts[2].isdigit():
+                        response = "ERROR: Usage: PUT <filename> <size>"
                     else:
-                        writer.write(b"READY")
-                        await writer.drain()
-                        data = await reader.read(4096)
-                        file_path = self.root / parts[1]
-                        with open(file_path, 'wb') as f:
-                            f.write(data)
-                        response = "OK"
+                        file_path = self._resolve(parts[1])
+                        if file_path is None:
+                            response = "ERROR: Invalid filename"
+                        else:
+                            await self.receive_file(reader, writer, file_path, int(parts[2]))
+                            response = "OK"
                 elif cmd == 'QUIT':
                     response = "BYE"
-                    writer.write(response.encode())
+                    writer.write(response.encode() + b"\n")
                     await writer.drain()
                     break
                 else:
                     response = "ERROR: Unknown command"
-                    
-                writer.write(response.encode())
+
+                writer.write(response.encode() + b"\n")
                 await writer.drain()
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError) as e:
+            # Client went away mid-transfer, the disk failed, or a command line ran past STREAM_LIMIT
+            print(f"Connection with {addr} failed: {e!r}")
         finally:
             writer.close()
-            await writer.wait_closed()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
             print(f"Connection with {addr} closed")
 
 async def run_async_ftp_server():
     server = AsyncFTPServer('ftp_root')
     server_coro = await asyncio.start_server(
-        server.handle_client, '127.0.0.1', 2121)
-    
+        server.handle_client, '127.0.0.1', 2121, limit=STREAM_LIMIT)
+
     async with server_coro:
         print("Async FTP Server running on port 2121")
         await server_coro.serve_forever()
 
 if __name__ == '__main__':
-    asyncio.run(run_async_ftp_server())
\ No newline at end of file
+    asyncio.run(run_async_ftp_server())
@@ -1,5 +1,9 @@
 # FTP Client (AsyncIO)
 import asyncio
+import os
+
+# Matches the server: StreamReader buffer limit and largest chunk handled at once
+STREAM_LIMIT = 1 << 20
 
 class AsyncFTPClient:
     def __init__(self):
@@ -9,41 +13,76 @@ class AsyncFTPClient:
     async def connect(self, host, port):
         host = input("Enter the ftp server ip:")
         port = int(input("Enter the server port number:"))
-        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.reader, self.writer = await asyncio.open_connection(host, port, limit=STREAM_LIMIT)
         print(f"Connected to {host}:{port}")
 
     async def send_command(self, command):
+        # Returns the reply's status line
         self.writer.write(command.encode() + b'\n')
         await self.writer.drain()
-        return await self.reader.read(4096)
+        return (await self.reader.readline()).decode().strip()
+
+    @staticmethod
+    def _size(status):
+        # "SIZE <n>" -> n, anything else (an ERROR line) -> None
+        parts = status.split()
+        if len(parts) == 2 and parts[0] == 'SIZE' and parts[1].isdigit():
+            return int(parts[1])
+        return None
 
     async def list_files(self):
-        response = await self.send_command('LIST')
-        print("Files:", response.decode())
+        status = await self.send_command('LIST')
+        size = self._size(status)
+        if size is None:
+            print(status)
+            return
+        print("Files:", (await self.reader.readexactly(size)).decode())
 
     async def get_file(self, filename):
-        response = await self.send_command(f'GET {filename}')
-        if response.startswith(b'ERROR'):
-            print(response.decode())
-        else:
-            with open(filename, 'wb') as f:
-                f.write(response)
-            print(f"Downloaded {filename}")
+        status = await self.send_command(f'GET {filename}')
+        size = self._size(status)
+        if size is None:
+            print(status)
+            return
+        # Streamed to a temporary name so an interrupted download leaves the old file alone
+        tmp_path = f"{filename}.part"
+        try:
+            with open(tmp_path, 'wb') as f:
+                remaining = size
+                while remaining:
+                    chunk = await self.reader.read(min(STREAM_LIMIT, remaining))
+                    if not chunk:
+                        raise asyncio.IncompleteReadError(b'', remaining)
+                    f.write(chunk)
+                    remaining -= len(chunk)
+            os.replace(tmp_path, filename)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        print(f"Downloaded {filename} ({size} bytes)")
 
     async def put_file(self, filename):
         try:
-            with open(filename, 'rb') as f:
-                content = f.read()
+            f = open(filename, 'rb')
         except FileNotFoundError:
             print(f"File {filename} not found")
             return
-            
-        response = await self.send_command(f'PUT {filename}')
-        if response.decode() == 'READY':
-            self.writer.write(content)
-            await self.writer.drain()
-            response = await self.reader.read(4096)
-            print(response.decode())
+
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            response = await self.send_command(f'PUT {os.path.basename(filename)} {size}')
+            if response != 'READY':
+                print(response)
+                return
+            # Straight from the page cache to the socket where the transport allows it
+            # (sendfile() rejects a count of 0)
+            if size:
+                await asyncio.get_running_loop().sendfile(self.writer.transport, f, 0, size)
+        response = (await self.reader.readline()).decode().strip()
+        print(response)
 
     async def quit(self):
         await self.send_command('QUIT')
@@ -53,13 +92,13 @@ class AsyncFTPClient:
 async def main():
     client = AsyncFTPClient()
     await client.connect('localhost', 2121)
-    
+
     # Example usage
     await client.list_files()
-    await client.put_file('example.txt')  
+    await client.put_file('example.txt')
     await client.list_files()
     await client.get_file('example.txt')
     await client.quit()
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())